@@ -36,3 +36,12 @@ class ScrapingConfig:
     
     MAX_CONCURRENT_REQUESTS = 10  # Aumentado para single mode paralelizado
     BATCH_SIZE = 100  # API aceita até 100 IDs por request
+    
+    # content_descriptorids que marcam o bundle como +18 (3 = Adult Only Sexual Content)
+    NSFW_DESCRIPTOR_IDS = frozenset({3})
+    
+    # Cache em disco dos bundles já extraídos (pula IDs ainda frescos)
+    DISK_CACHE_DIR = "data/bundle_cache"
+    # Abaixo do intervalo entre scrapings (cron 06:00 e 12:00 = 6h): cada scraping agendado
+    # busca preços novos; o cache só evita refazer bundles num re-run logo após falha
+    DISK_CACHE_TTL = 4 * 3600
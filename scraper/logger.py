@@ -62,6 +62,10 @@ class Logger:
         """Log de erro"""
         self.logger.error(message)
     
+    def exception(self, message: str):
+        """Log de erro com traceback da exceção atual"""
+        self.logger.exception(message)
+    
     def debug(self, message: str):
         """Log de debug"""
         self.logger.debug(message)
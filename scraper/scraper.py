@@ -5,7 +5,12 @@ Versão 2.0 - Apenas API, sem parsing de HTML
 import asyncio
 import aiohttp
 import json
-from typing import List, Dict, Optional
+import os
+import time
+import tempfile
+import orjson
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple
 from .config import ScrapingConfig
 from .logger import Logger
 
@@ -23,6 +28,15 @@ class BundleScraper:
         self.logger = Logger()
         self.session: Optional[aiohttp.ClientSession] = None
         self._semaphore: Optional[asyncio.Semaphore] = None
+        
+        # Controle de bloqueio compartilhado (429/403) entre todas as tasks
+        self._unblocked: Optional[asyncio.Event] = None
+        self._resume_task: Optional[asyncio.Task] = None
+        self.blocked_until = 0  # Timestamp para controle de bloqueio
+        
+        # Cache em disco: bundle_id -> último resultado extraído
+        self._disk_cache = Path(self.config.DISK_CACHE_DIR)
+        self._disk_cache.mkdir(parents=True, exist_ok=True)
     
     async def __aenter__(self):
         """Context manager para gerenciar sessão HTTP"""
@@ -31,14 +45,154 @@ class BundleScraper:
             headers=self.config.HEADERS
         )
         self._semaphore = asyncio.Semaphore(self.config.MAX_CONCURRENT_REQUESTS)
-        self.blocked_until = 0  # Timestamp para controle de bloqueio
+        self._unblocked = asyncio.Event()
+        self._unblocked.set()
+        self._cache_prune()
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Fecha sessão HTTP ao sair do context manager"""
+        if self._resume_task:
+            self._resume_task.cancel()
         if self.session:
             await self.session.close()
     
+    async def _wait_if_blocked(self):
+        """Aguarda o fim de um bloqueio da Steam antes de iniciar um request"""
+        if not self._unblocked.is_set():
+            remaining = max(0, int(self.blocked_until - time.time()))
+            self.logger.warning(f"⏳ Aguardando fim do bloqueio ({remaining}s restantes)")
+            await self._unblocked.wait()
+    
+    def _block_for(self, seconds: int):
+        """
+        Pausa todas as tasks por alguns segundos (429/403 da Steam)
+        
+        O sleep acontece fora do semáforo: nenhuma task segura slot
+        enquanto espera, e todas retomam juntas ao fim do bloqueio.
+        
+        Args:
+            seconds: Duração do bloqueio
+        """
+        self.blocked_until = max(self.blocked_until, time.time() + seconds)
+        if self._unblocked.is_set():
+            self._unblocked.clear()
+            self._resume_task = asyncio.create_task(self._resume_after())
+    
+    async def _resume_after(self):
+        """Libera as tasks quando o bloqueio expira (estendido se houver novos 429/403)"""
+        while (remaining := self.blocked_until - time.time()) > 0:
+            await asyncio.sleep(remaining)
+        self._unblocked.set()
+    
+    @staticmethod
+    def _split_included_items(items: Optional[List[Dict]]) -> Tuple[List[int], List[int]]:
+        """
+        Separa included_items em app_ids e package_ids numa única passada
+        
+        Args:
+            items: included_items retornado pela API
+            
+        Returns:
+            (app_ids, package_ids) - item_type 0 = app, 1 = package
+        """
+        app_ids, package_ids = [], []
+        for item in items or ():
+            item_type = item.get('item_type')
+            if item_type == 0:
+                app_ids.append(item['id'])
+            elif item_type == 1:
+                package_ids.append(item['id'])
+        return app_ids, package_ids
+    
+    def _cache_expired(self, mtime: float) -> bool:
+        """Indica se uma entrada do cache passou do DISK_CACHE_TTL"""
+        return mtime < time.time() - self.config.DISK_CACHE_TTL
+    
+    def _cache_prune(self):
+        """Remove do cache em disco entradas expiradas e temporários órfãos"""
+        removed = 0
+        try:
+            with os.scandir(self._disk_cache) as entries:
+                for entry in entries:
+                    try:
+                        if entry.name.endswith('.tmp') or self._cache_expired(entry.stat().st_mtime):
+                            os.unlink(entry.path)
+                            removed += 1
+                    except OSError:
+                        continue
+        except OSError as e:
+            self.logger.warning(f"Falha ao limpar cache em disco: {e}")
+            return
+        
+        if removed:
+            self.logger.info(f"Cache em disco: {removed} entradas expiradas removidas")
+    
+    def _cache_file(self, bundle_id: str, mode: str) -> Path:
+        """Arquivo do cache por modo: batch não traz imagens/NSFW, então não serve ao single"""
+        return self._disk_cache / f"{bundle_id}.{mode}.json"
+    
+    def _cache_load(self, bundle_id: str, mode: str) -> Optional[Dict]:
+        """
+        Carrega bundle do cache em disco se ainda estiver fresco
+        
+        Entradas expiradas são apagadas ao serem encontradas
+        
+        Args:
+            bundle_id: ID do bundle
+            mode: 'single' ou 'batch' (modo de scraping que gerou a entrada)
+            
+        Returns:
+            Dados do bundle ou None se ausente/expirado
+        """
+        cache_file = self._cache_file(bundle_id, mode)
+        try:
+            if self._cache_expired(cache_file.stat().st_mtime):
+                cache_file.unlink(missing_ok=True)
+                return None
+            return orjson.loads(cache_file.read_bytes())
+        except (OSError, orjson.JSONDecodeError):
+            return None
+    
+    def _cache_store(self, bundle_id: str, result: Dict, mode: str):
+        """
+        Salva bundle no cache em disco (escrita atômica)
+        
+        Args:
+            bundle_id: ID do bundle
+            result: Dados extraídos do bundle
+            mode: 'single' ou 'batch'
+        """
+        try:
+            with tempfile.NamedTemporaryFile(dir=self._disk_cache, suffix='.tmp', delete=False) as tmp:
+                tmp.write(orjson.dumps(result))
+            os.replace(tmp.name, self._cache_file(bundle_id, mode))
+        except OSError as e:
+            self.logger.warning(f"Falha ao salvar bundle {bundle_id} no cache: {e}")
+    
+    def _split_cached(self, bundle_ids: List[str], mode: str) -> Tuple[List[Dict], List[str]]:
+        """
+        Separa bundles ainda frescos no cache em disco dos que precisam ser buscados
+        
+        Args:
+            bundle_ids: Lista de IDs
+            mode: 'single' ou 'batch'
+            
+        Returns:
+            (bundles do cache, IDs para buscar)
+        """
+        cached, to_fetch = [], []
+        for bid in bundle_ids:
+            if (bundle := self._cache_load(bid, mode)) is not None:
+                cached.append(bundle)
+            else:
+                to_fetch.append(bid)
+        
+        if cached:
+            self.logger.info(f"Cache em disco: {len(cached)} bundles frescos, {len(to_fetch)} para buscar")
+        
+        return cached, to_fetch
+    
     async def scrape_bundle_list(self) -> List[str]:
         """
         Retorna lista de IDs de bundles conhecidos do JSON
@@ -49,9 +203,6 @@ class BundleScraper:
         self.logger.start_operation("Carregando lista de bundles")
         
         # Carrega lista de IDs do JSON
-        import json
-        from pathlib import Path
-        
         json_file = Path("data/known_bundles.json")
         
         try:
@@ -88,14 +239,6 @@ class BundleScraper:
         Returns:
             Dicionário com dados estruturados do bundle ou None se falhar
         """
-        # Verifica se estamos bloqueados
-        import time
-        if hasattr(self, 'blocked_until') and time.time() < self.blocked_until:
-            remaining = int(self.blocked_until - time.time())
-            self.logger.warning(f"⏳ Aguardando fim do bloqueio ({remaining}s restantes)")
-            await asyncio.sleep(min(5, remaining))
-            return None
-        
         # Usa API oficial da Steam
         params = {
             'bundleids': str(bundle_id),
@@ -106,20 +249,21 @@ class BundleScraper:
         self.logger.info(f"Buscando bundle {bundle_id} via API...")
         
         try:
+            await self._wait_if_blocked()
             async with self._semaphore:
+                # Bloqueio pode ter começado enquanto a task esperava na fila do semáforo
+                await self._wait_if_blocked()
                 async with self.session.get(self.config.BUNDLE_API_URL, params=params) as response:
                     # Verifica bloqueio da Steam
                     if response.status == 429:  # Too Many Requests
                         retry_after = int(response.headers.get('Retry-After', 60))
                         self.logger.error(f" BLOQUEADO pela Steam! Aguardando {retry_after}s...")
-                        self.blocked_until = time.time() + retry_after
-                        await asyncio.sleep(retry_after)
+                        self._block_for(retry_after)
                         return None
                     
                     elif response.status == 403:  # Forbidden
                         self.logger.error(f" ACESSO NEGADO pela Steam! Aguardando 120s...")
-                        self.blocked_until = time.time() + 120
-                        await asyncio.sleep(120)
+                        self._block_for(120)
                         return None
                     
                     elif response.status == 200:
@@ -151,12 +295,14 @@ class BundleScraper:
                         
                         #  DETECÇÃO: Verifica se é conteúdo NSFW/+18
                         # Steam API retorna content_descriptorids com ID 3 para conteúdo adulto
-                        content_descriptors = bundle_data.get('content_descriptorids', [])
-                        is_nsfw = 3 in content_descriptors  # ID 3 = Adult Only Sexual Content
+                        content_descriptors = bundle_data.get('content_descriptorids') or ()
+                        is_nsfw = not self.config.NSFW_DESCRIPTOR_IDS.isdisjoint(content_descriptors)
                         
                         if is_nsfw:
                             self.logger.info(f"Bundle {bundle_id}: Detectado conteúdo +18/NSFW")
                         
+                        app_ids, package_ids = self._split_included_items(bundle_data.get('included_items'))
+                        
                         # Calcula desconto percentual
                         if original_price_cents > 0:
                             discount_pct = round(((original_price_cents - final_price_cents) / original_price_cents) * 100)
@@ -191,17 +337,13 @@ class BundleScraper:
                                 'supported': bundle_data.get('vr_support', {}).get('vrhmd', False),
                                 'only': bundle_data.get('vr_support', {}).get('vrhmd_only', False)
                             },
-                            'app_ids': [item['id'] for item in bundle_data.get('included_items', []) if item.get('item_type') == 0],  # 0 = app
-                            'package_ids': [item['id'] for item in bundle_data.get('included_items', []) if item.get('item_type') == 1],  # 1 = package
+                            'app_ids': app_ids,  # 0 = app
+                            'package_ids': package_ids,  # 1 = package
                             'coming_soon': not bundle_data.get('visible', True),
-                            'games': [],
+                            'games': [{'app_id': app_id} for app_id in app_ids],
                             'needs_browser_scraping': False  # API retorna tudo
                         }
                         
-                        # Preenche lista de jogos
-                        if result['app_ids']:
-                            result['games'] = [{'app_id': app_id} for app_id in result['app_ids']]
-                        
                         self.logger.success(f"Bundle {bundle_id} extraído via API: {result['name']} (desconto: {discount_pct}%)")
                         return result
                     
@@ -209,8 +351,11 @@ class BundleScraper:
                         self.logger.warning(f"Bundle {bundle_id}: Status {response.status}")
                         return None
                         
-        except Exception as e:
-            self.logger.error(f"Erro ao processar bundle {bundle_id}: {e}")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.logger.warning(f"Erro de rede no bundle {bundle_id}: {e}")
+            return None
+        except Exception:
+            self.logger.exception(f"Erro inesperado ao processar bundle {bundle_id}")
             return None
     
     async def scrape_bundles_batch(self, bundle_ids: List[str]) -> List[Dict]:
@@ -237,22 +382,21 @@ class BundleScraper:
         }
         
         try:
+            await self._wait_if_blocked()
             async with self._semaphore:
+                # Bloqueio pode ter começado enquanto a task esperava na fila do semáforo
+                await self._wait_if_blocked()
                 async with self.session.get(self.config.BUNDLE_API_URL, params=params) as response:
                     # Verifica bloqueio da Steam
                     if response.status == 429:  # Too Many Requests
-                        import time
                         retry_after = int(response.headers.get('Retry-After', 60))
                         self.logger.error(f" BLOQUEADO pela Steam (batch)! Aguardando {retry_after}s...")
-                        self.blocked_until = time.time() + retry_after
-                        await asyncio.sleep(retry_after)
+                        self._block_for(retry_after)
                         return []
                     
                     elif response.status == 403:  # Forbidden
-                        import time
                         self.logger.error(f" ACESSO NEGADO pela Steam (batch)! Aguardando 120s...")
-                        self.blocked_until = time.time() + 120
-                        await asyncio.sleep(120)
+                        self._block_for(120)
                         return []
                     
                     elif response.status == 200:
@@ -277,6 +421,8 @@ class BundleScraper:
                             if final_price_cents == 0 and original_price_cents == 0:
                                 continue
                             
+                            app_ids, package_ids = self._split_included_items(bundle_data.get('included_items'))
+                            
                             # Calcula desconto
                             if original_price_cents > 0:
                                 discount_pct = round(((original_price_cents - final_price_cents) / original_price_cents) * 100)
@@ -310,10 +456,10 @@ class BundleScraper:
                                     'supported': bundle_data.get('vr_support', {}).get('vrhmd', False),
                                     'only': bundle_data.get('vr_support', {}).get('vrhmd_only', False)
                                 },
-                                'app_ids': [item['id'] for item in bundle_data.get('included_items', []) if item.get('item_type') == 0],
-                                'package_ids': [item['id'] for item in bundle_data.get('included_items', []) if item.get('item_type') == 1],
+                                'app_ids': app_ids,
+                                'package_ids': package_ids,
                                 'coming_soon': not bundle_data.get('visible', True),
-                                'games': [{'app_id': item['id']} for item in bundle_data.get('included_items', []) if item.get('item_type') == 0],
+                                'games': [{'app_id': app_id} for app_id in app_ids],
                                 'needs_browser_scraping': False
                             }
                             
@@ -323,10 +469,11 @@ class BundleScraper:
                     else:
                         self.logger.warning(f"API retornou status {response.status}")
                         return []
-        except Exception as e:
-            self.logger.error(f"Erro ao buscar batch: {e}")
-            import traceback
-            self.logger.error(traceback.format_exc())
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.logger.warning(f"Erro de rede no batch: {e}")
+            return []
+        except Exception:
+            self.logger.exception("Erro inesperado ao buscar batch")
             return []
     
     async def scrape_all_bundles(self, bundle_ids: Optional[List[str]] = None) -> List[Dict]:
@@ -351,21 +498,26 @@ class BundleScraper:
         
         self.logger.info(f"Processando {len(bundle_ids)} bundles...")
         
+        # Bundles ainda frescos no cache em disco não são buscados novamente
+        bundles, to_fetch = self._split_cached(bundle_ids, 'batch')
+        
         # Processa bundles em batches (API aceita até 100 IDs por request)
-        bundles = []
         batch_size = 100
         
-        for i in range(0, len(bundle_ids), batch_size):
-            batch = bundle_ids[i:i + batch_size]
+        for i in range(0, len(to_fetch), batch_size):
+            batch = to_fetch[i:i + batch_size]
             self.logger.info(f"Processando batch {i//batch_size + 1} ({len(batch)} bundles)...")
             
             batch_bundles = await self.scrape_bundles_batch(batch)
             bundles.extend(batch_bundles)
             
+            for bundle in batch_bundles:
+                self._cache_store(bundle['id'], bundle, 'batch')
+            
             self.logger.info(f"Batch concluído: {len(batch_bundles)}/{len(batch)} bundles válidos")
             
             # Pequena pausa entre batches
-            if i + batch_size < len(bundle_ids):
+            if i + batch_size < len(to_fetch):
                 await asyncio.sleep(self.config.REQUEST_DELAY)
         
         self.logger.success(f"Scraped {len(bundles)}/{len(bundle_ids)} bundles com sucesso")
@@ -404,12 +556,16 @@ class BundleScraper:
         if not bundle_ids:
             return []
         
+        # Bundles ainda frescos no cache em disco (ex.: re-run após falha) não são buscados novamente
+        total = len(bundle_ids)
+        all_bundles, bundle_ids = self._split_cached(bundle_ids, 'single')
+        if not bundle_ids:
+            return all_bundles
+        
         self.logger.info(f"🔄 Scraping PARALELO de {len(bundle_ids)} bundles (single mode)")
         self.logger.info(f"   Concorrência: {self.config.MAX_CONCURRENT_REQUESTS} requests simultâneas")
         self.logger.info(f"   Batch size: {batch_size} bundles por grupo")
         
-        all_bundles = []
-        
         # Processa em grupos para não criar muitas tasks de uma vez
         for i in range(0, len(bundle_ids), batch_size):
             batch = bundle_ids[i:i + batch_size]
@@ -429,6 +585,7 @@ class BundleScraper:
             for result in results:
                 if isinstance(result, dict):  # Bundle válido
                     valid_bundles.append(result)
+                    self._cache_store(result['id'], result, 'single')
                 elif isinstance(result, Exception):  # Erro
                     self.logger.error(f"Erro em bundle: {result}")
             
@@ -440,5 +597,5 @@ class BundleScraper:
             if i + batch_size < len(bundle_ids):
                 await asyncio.sleep(1)
         
-        self.logger.success(f"🎉 Total scraped: {len(all_bundles)}/{len(bundle_ids)} bundles com dados completos")
+        self.logger.success(f"🎉 Total scraped: {len(all_bundles)}/{total} bundles com dados completos")
         return all_bundles
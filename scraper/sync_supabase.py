@@ -3,15 +3,102 @@ Sincronização com Supabase
 Envia dados refinados do PostgreSQL local para a nuvem (vitrine pública)
 """
 import asyncio
+import atexit
+import functools
 import os
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Mapping, Any, AsyncIterator, Tuple
 from datetime import datetime, timedelta
+import httpx
+import orjson
 from supabase import create_client, Client
-from sqlalchemy import select
-from .database import Database, BundleModel
+from sqlalchemy import select, func, cast, literal, or_
+from sqlalchemy.dialects.postgresql import JSONB, JSONPATH
+from .database import Database, BundleModel, analyze_discount
 from .logger import Logger
 
 
+# Pool HTTP do PostgREST (upserts em sequência reaproveitam conexões)
+POSTGREST_LIMITS = httpx.Limits(max_connections=60, max_keepalive_connections=40, keepalive_expiry=60)
+POSTGREST_TIMEOUT = httpx.Timeout(30.0, connect=10.0)
+POSTGREST_RETRIES = 3
+
+# Colunas lidas no sync (select colunar: sem hidratar objetos ORM)
+# price_history entra em _build_sync_query: recortado via jsonpath no PostgreSQL, completo só no SQLite
+SYNC_COLUMNS = (
+    BundleModel.id,
+    BundleModel.name,
+    BundleModel.url,
+    BundleModel.final_price,
+    BundleModel.original_price,
+    BundleModel.discount,
+    BundleModel.currency,
+    BundleModel.games,
+    BundleModel.games_count,
+    BundleModel.is_valid,
+    BundleModel.image_url,
+    BundleModel.is_nsfw,
+    BundleModel.discount_analysis_json,
+    BundleModel.first_seen,
+    BundleModel.last_updated,
+)
+
+# Histórico recente filtrado no próprio PostgreSQL (evita fromisoformat por entrada)
+RECENT_HISTORY_PATH = '$[*] ? (@.date >= $cutoff)'
+RECENT_HISTORY_DAYS = 30
+
+# Teto de lotes por limpeza (segurança contra loop infinito)
+CLEANUP_MAX_BATCHES = 200
+
+# Sessões injetadas nos clientes compartilhados (fechadas em close_supabase_clients, no atexit)
+_pooled_sessions: List[httpx.Client] = []
+
+
+def _install_pooled_session(client: Client):
+    """Troca a sessão HTTP do PostgREST por uma com pool e keep-alive ajustados"""
+    postgrest = client.postgrest
+    default_session = postgrest.session
+    
+    # Limits vão no transport: httpx ignora `limits` do Client quando há transport explícito
+    postgrest.session = httpx.Client(
+        base_url=default_session.base_url,
+        headers=default_session.headers,
+        timeout=POSTGREST_TIMEOUT,
+        transport=httpx.HTTPTransport(limits=POSTGREST_LIMITS, retries=POSTGREST_RETRIES)
+    )
+    default_session.close()
+    _pooled_sessions.append(postgrest.session)
+    
+    Logger('supabase_sync').info(
+        f"Pool PostgREST: max_connections={POSTGREST_LIMITS.max_connections}, "
+        f"keepalive={POSTGREST_LIMITS.max_keepalive_connections} "
+        f"({POSTGREST_LIMITS.keepalive_expiry}s), retries={POSTGREST_RETRIES}"
+    )
+
+
+@functools.lru_cache(maxsize=4)
+def _get_supabase_client(url: str, key: str) -> Client:
+    """
+    Retorna cliente Supabase compartilhado por (url, key)
+    
+    Evita refazer o handshake TLS e fragmentar o pool HTTP
+    a cada novo SupabaseSync.
+    """
+    client = create_client(url, key)
+    _install_pooled_session(client)
+    return client
+
+
+def close_supabase_clients():
+    """Fecha as sessões HTTP dos clientes compartilhados e esvazia o cache"""
+    while _pooled_sessions:
+        _pooled_sessions.pop().close()
+    _get_supabase_client.cache_clear()
+
+
+# Clientes vivem o processo inteiro (reuso entre chamadas); sessões fechadas só na saída
+atexit.register(close_supabase_clients)
+
+
 class SupabaseSync:
     """
     Sincroniza bundles do banco local para Supabase
@@ -43,102 +130,207 @@ class SupabaseSync:
                 "SUPABASE_URL e SUPABASE_SERVICE_KEY devem estar configurados"
             )
         
-        # Cliente Supabase
-        self.supabase: Client = create_client(self.supabase_url, self.supabase_key)
+        # Cliente Supabase (compartilhado entre instâncias)
+        self.supabase: Client = _get_supabase_client(self.supabase_url, self.supabase_key)
         
         # Banco local
+        self._owns_db = local_db is None
         self.db = local_db or Database()
     
+    async def close(self):
+        """
+        Libera recursos deste sincronizador
+        
+        O cliente Supabase é compartilhado e NÃO é fechado aqui
+        (fechado por close_supabase_clients() no atexit do processo);
+        o banco local só é fechado se foi criado por esta instância.
+        """
+        if self._owns_db:
+            await self.db.close()
+    
+    def _build_sync_query(
+        self,
+        hours_ago: Optional[int] = 24,
+        only_valid: bool = True,
+        only_with_discount: bool = False,
+        limit: Optional[int] = None,
+        only_changed: bool = True,
+        currency: Optional[str] = None,
+        history_cutoff: Optional[datetime] = None
+    ):
+        """Monta o select colunar dos bundles a sincronizar"""
+        query = select(*SYNC_COLUMNS)
+        
+        if history_cutoff is None:
+            _, history_cutoff = self._sync_timestamps()
+        
+        # PostgreSQL: só o histórico dos últimos 30 dias via jsonpath (o completo nem sai do banco)
+        if self.db.engine.dialect.name == 'postgresql':
+            query = query.add_columns(
+                func.jsonb_path_query_array(
+                    cast(BundleModel.price_history, JSONB),
+                    cast(literal(RECENT_HISTORY_PATH), JSONPATH),
+                    func.jsonb_build_object('cutoff', history_cutoff.isoformat())
+                ).label('recent_history')
+            )
+        else:
+            # SQLite (dev): histórico completo, recortado em Python no bundle_to_dict
+            query = query.add_columns(BundleModel.price_history)
+        
+        # Filtros
+        if hours_ago is not None:
+            cutoff_time = datetime.utcnow() - timedelta(hours=hours_ago)
+            query = query.where(BundleModel.last_updated >= cutoff_time)
+        
+        if only_valid:
+            query = query.where(BundleModel.is_valid == True)
+        
+        if only_with_discount:
+            query = query.where(BundleModel.discount > 0)
+        
+        if currency is not None:
+            query = query.where(BundleModel.currency == currency)
+        
+        # Pula bundles que não mudaram desde o último sync
+        if only_changed:
+            query = query.where(or_(
+                BundleModel.synced_at.is_(None),
+                BundleModel.last_updated > BundleModel.synced_at
+            ))
+        
+        # Ordena por desconto (maiores primeiro)
+        query = query.order_by(BundleModel.discount.desc())
+        
+        if limit is not None:
+            query = query.limit(limit)
+        
+        return query
+    
     async def get_bundles_to_sync(
         self,
-        hours_ago: int = 24,
+        hours_ago: Optional[int] = 24,
         only_valid: bool = True,
-        only_with_discount: bool = False
-    ) -> List[BundleModel]:
+        only_with_discount: bool = False,
+        limit: Optional[int] = None,
+        only_changed: bool = True,
+        currency: Optional[str] = None,
+        history_cutoff: Optional[datetime] = None
+    ) -> List[Mapping[str, Any]]:
         """
         Busca bundles para sincronizar
         
         Args:
-            hours_ago: Apenas bundles atualizados nas últimas X horas
+            hours_ago: Apenas bundles atualizados nas últimas X horas (None = todos)
             only_valid: Apenas bundles válidos
             only_with_discount: Apenas bundles com desconto
+            limit: Quantidade máxima de bundles
+            only_changed: Apenas bundles alterados desde o último sync
+            currency: Apenas bundles nesta moeda (None = todas)
+            history_cutoff: Data mínima do histórico (None = calculada agora)
             
         Returns:
-            Lista de bundles para sincronizar
+            Lista de linhas (coluna -> valor) para sincronizar
         """
         async with self.db.async_session() as session:
-            query = select(BundleModel)
-            
-            # Filtros
-            cutoff_time = datetime.utcnow() - timedelta(hours=hours_ago)
-            query = query.where(BundleModel.last_updated >= cutoff_time)
-            
-            if only_valid:
-                query = query.where(BundleModel.is_valid == True)
-            
-            if only_with_discount:
-                query = query.where(BundleModel.discount > 0)
-            
-            # Ordena por desconto (maiores primeiro)
-            query = query.order_by(BundleModel.discount.desc())
+            query = self._build_sync_query(
+                hours_ago, only_valid, only_with_discount, limit,
+                only_changed=only_changed, currency=currency, history_cutoff=history_cutoff
+            )
             
             result = await session.execute(query)
-            bundles = result.scalars().all()
+            bundles = result.mappings().all()
             
             self.logger.info(f"Encontrados {len(bundles)} bundles para sincronizar")
             return bundles
     
-    def bundle_to_dict(self, bundle: BundleModel) -> Dict:
+    async def stream_bundles_to_sync(
+        self,
+        batch_size: int = 100,
+        hours_ago: Optional[int] = 24,
+        only_valid: bool = True,
+        only_with_discount: bool = False,
+        history_cutoff: Optional[datetime] = None
+    ) -> AsyncIterator[List[Mapping[str, Any]]]:
         """
-        Converte modelo do banco local para formato Supabase
+        Lê bundles para sincronizar via cursor no servidor, em lotes
+        
+        Evita materializar todos os bundles (e seus JSONs) em memória.
         
         Args:
-            bundle: Modelo do bundle
+            batch_size: Tamanho de cada lote retornado
+            hours_ago: Apenas bundles atualizados nas últimas X horas (None = todos)
+            only_valid: Apenas bundles válidos
+            only_with_discount: Apenas bundles com desconto
+            history_cutoff: Data mínima do histórico (None = calculada agora)
+            
+        Yields:
+            Lotes de linhas (coluna -> valor)
+        """
+        async with self.db.async_session() as session:
+            query = self._build_sync_query(
+                hours_ago, only_valid, only_with_discount, history_cutoff=history_cutoff
+            )
+            
+            result = await session.stream(query)
+            async for partition in result.mappings().partitions(batch_size):
+                yield partition
+    
+    def bundle_to_dict(
+        self,
+        bundle: Mapping[str, Any],
+        synced_at: str,
+        history_cutoff: datetime
+    ) -> Dict:
+        """
+        Converte linha do banco local para formato Supabase
+        
+        Args:
+            bundle: Linha do bundle (colunas de SYNC_COLUMNS)
+            synced_at: Timestamp ISO do sync (o mesmo para todo o lote)
+            history_cutoff: Data mínima do histórico enviado (fallback sem jsonpath)
             
         Returns:
             Dicionário pronto para upsert
         """
-        # Análise de desconto real
-        discount_analysis = bundle.get_real_discount()
+        # Cópia única da linha: colunas de SYNC_COLUMNS já vêm no formato do Supabase
+        row = dict(bundle)
+        stored_analysis = row.pop('discount_analysis_json')
+        has_recent_history = 'recent_history' in row  # só no PostgreSQL (jsonpath)
+        if has_recent_history:
+            history = row.pop('recent_history') or []
+        else:
+            history = self._get_recent_history(row.pop('price_history'), history_cutoff)  # SQLite (dev)
+        
+        # Análise de desconto real (pré-calculada no save; recalcula só para linhas antigas)
+        # analyze_discount só olha os últimos 30 dias: o histórico recente basta
+        discount_analysis = stored_analysis or analyze_discount(history, row['original_price'])
         
         return {
-            'id': bundle.id,
-            'name': bundle.name,
-            'url': bundle.url,
-            
-            # Preços
-            'final_price': bundle.final_price,
-            'original_price': bundle.original_price,
-            'discount': bundle.discount,
-            'currency': bundle.currency,
-            
-            # Jogos
-            'games': bundle.games,
-            'games_count': bundle.games_count,
+            **row,
             
             # Metadados
-            'is_valid': bundle.is_valid,
             'is_discount_real': discount_analysis.get('is_real', True),
             'discount_analysis': discount_analysis.get('reason', ''),
-            'image_url': bundle.image_url or '',  # URL da imagem header
-            'is_nsfw': bundle.is_nsfw or False,  # Conteúdo +18/adulto
+            'image_url': row['image_url'] or '',  # URL da imagem header
+            'is_nsfw': row['is_nsfw'] or False,  # Conteúdo +18/adulto
             
             # Histórico simplificado (últimos 30 dias)
-            'price_history': self._get_recent_history(bundle.price_history),
+            'price_history': history,
             
             # Timestamps
-            'first_seen': bundle.first_seen.isoformat() if bundle.first_seen else None,
-            'last_updated': bundle.last_updated.isoformat() if bundle.last_updated else None,
-            'synced_at': datetime.utcnow().isoformat()
+            'first_seen': row['first_seen'].isoformat() if row['first_seen'] else None,
+            'last_updated': row['last_updated'].isoformat() if row['last_updated'] else None,
+            'synced_at': synced_at
         }
     
-    def _get_recent_history(self, full_history: Optional[List[Dict]], days: int = 30) -> List[Dict]:
-        """Retorna apenas histórico recente (para não sobrecarregar Supabase)"""
+    def _get_recent_history(self, full_history: Optional[List[Dict]], cutoff: datetime) -> List[Dict]:
+        """
+        Retorna apenas histórico recente (para não sobrecarregar Supabase)
+        Fallback em Python para bancos sem jsonpath (SQLite em desenvolvimento)
+        """
         if not full_history or not isinstance(full_history, list):
             return []
         
-        cutoff = datetime.utcnow() - timedelta(days=days)
-        
         recent = []
         for entry in full_history:
             try:
@@ -150,13 +342,79 @@ class SupabaseSync:
         
         return recent
     
-    def sync_bundles(self, bundles: List[BundleModel], batch_size: int = 100) -> Dict:
+    def _upsert_batch(self, batch_data: List[Dict]):
+        """
+        Upsert de um lote no Supabase (insere ou atualiza se já existe)
+        
+        POST direto na sessão do PostgREST com o corpo serializado via orjson,
+        em vez do json da stdlib usado por .upsert().execute().
+        """
+        # merge-duplicates: conflitos na PRIMARY KEY viram UPDATE
+        # return=minimal: não retorna dados, melhora performance
+        response = self.supabase.postgrest.session.post(
+            '/bundles',
+            content=orjson.dumps(batch_data),
+            headers={
+                'Content-Type': 'application/json',
+                'Prefer': 'resolution=merge-duplicates,return=minimal'
+            }
+        )
+        response.raise_for_status()
+    
+    def _sync_timestamps(self):
+        """Retorna (synced_at, history_cutoff), calculados uma vez por sync"""
+        now = datetime.utcnow()
+        return now.isoformat(), now - timedelta(days=RECENT_HISTORY_DAYS)
+    
+    async def _sync_batch(
+        self,
+        batch_num: int,
+        batch: List[Mapping[str, Any]],
+        stats: Dict,
+        synced_at: str,
+        history_cutoff: datetime
+    ):
+        """Converte e envia um lote, contabilizando sucesso/falha em stats"""
+        batch_data = [self.bundle_to_dict(b, synced_at, history_cutoff) for b in batch]
+        
+        try:
+            # Cliente Supabase é síncrono: roda em thread para não travar o loop
+            await asyncio.to_thread(self._upsert_batch, batch_data)
+            
+            stats['success'] += len(batch)
+            self.logger.info(f"Lote {batch_num}: {len(batch)} bundles sincronizados")
+            
+        except Exception as e:
+            stats['failed'] += len(batch)
+            error_msg = f"Erro no lote {batch_num}: {str(e)}"
+            stats['errors'].append(error_msg)
+            self.logger.error(error_msg)
+            return
+        
+        try:
+            # Marca como sincronizados (próximo sync só envia o que mudar depois disso)
+            await self.db.mark_bundles_synced(
+                [b['id'] for b in batch],
+                datetime.fromisoformat(synced_at)
+            )
+        except Exception as e:
+            self.logger.warning(f"Lote {batch_num}: falha ao marcar synced_at local: {e}")
+    
+    async def sync_bundles(
+        self,
+        bundles: List[Mapping[str, Any]],
+        batch_size: int = 100,
+        concurrency: int = 8,
+        timestamps: Optional[Tuple[str, datetime]] = None
+    ) -> Dict:
         """
-        Sincroniza bundles para Supabase em lotes
+        Sincroniza bundles para Supabase em lotes concorrentes
         
         Args:
             bundles: Lista de bundles para sincronizar
             batch_size: Tamanho do lote para upsert
+            concurrency: Máximo de lotes enviados simultaneamente
+            timestamps: (synced_at, history_cutoff) já usados na leitura (None = calcula agora)
             
         Returns:
             Estatísticas da sincronização
@@ -170,29 +428,18 @@ class SupabaseSync:
             'errors': []
         }
         
-        # Processa em lotes
-        for i in range(0, len(bundles), batch_size):
-            batch = bundles[i:i + batch_size]
-            batch_data = [self.bundle_to_dict(b) for b in batch]
-            
-            try:
-                # Upsert no Supabase (insere ou atualiza se já existe)
-                # O método upsert do Supabase automaticamente detecta conflitos na PRIMARY KEY
-                response = self.supabase.table('bundles').upsert(
-                    batch_data,
-                    returning='minimal'  # Não retorna dados, melhora performance
-                ).execute()
-                
-                stats['success'] += len(batch)
-                self.logger.info(
-                    f"Lote {i//batch_size + 1}: {len(batch)} bundles sincronizados"
-                )
-                
-            except Exception as e:
-                stats['failed'] += len(batch)
-                error_msg = f"Erro no lote {i//batch_size + 1}: {str(e)}"
-                stats['errors'].append(error_msg)
-                self.logger.error(error_msg)
+        semaphore = asyncio.Semaphore(concurrency)
+        synced_at, history_cutoff = timestamps or self._sync_timestamps()
+        
+        async def send_batch(batch_num: int, batch: List[Mapping[str, Any]]):
+            async with semaphore:
+                await self._sync_batch(batch_num, batch, stats, synced_at, history_cutoff)
+        
+        # Processa em lotes (até `concurrency` em paralelo)
+        await asyncio.gather(*[
+            send_batch(i // batch_size + 1, bundles[i:i + batch_size])
+            for i in range(0, len(bundles), batch_size)
+        ])
         
         self.logger.success(
             f"Sincronização concluída: {stats['success']} sucesso, {stats['failed']} falhas"
@@ -204,49 +451,117 @@ class SupabaseSync:
     async def full_sync(
         self,
         hours_ago: int = 24,
-        only_with_discount: bool = False
+        only_with_discount: bool = False,
+        batch_size: int = 100,
+        concurrency: int = 8
     ) -> Dict:
         """
         Sincronização completa: busca + upload
         
+        Produtor/consumidor: enquanto os lotes já lidos são enviados ao
+        Supabase, o próximo lote continua sendo lido do banco local.
+        
         Args:
             hours_ago: Apenas bundles das últimas X horas
             only_with_discount: Apenas bundles com desconto
+            batch_size: Tamanho do lote para upsert
+            concurrency: Máximo de lotes enviados simultaneamente
             
         Returns:
             Estatísticas da sincronização
         """
-        # Busca bundles
-        bundles = await self.get_bundles_to_sync(
-            hours_ago=hours_ago,
-            only_with_discount=only_with_discount
-        )
+        self.logger.start_operation("Sincronização de bundles (streaming)")
+        
+        stats = {
+            'total': 0,
+            'success': 0,
+            'failed': 0,
+            'errors': []
+        }
         
-        if not bundles:
+        synced_at, history_cutoff = self._sync_timestamps()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+        
+        async def producer():
+            try:
+                batch_num = 0
+                async for batch in self.stream_bundles_to_sync(
+                    batch_size=batch_size,
+                    hours_ago=hours_ago,
+                    only_with_discount=only_with_discount,
+                    history_cutoff=history_cutoff
+                ):
+                    batch_num += 1
+                    stats['total'] += len(batch)
+                    await queue.put((batch_num, batch))
+            finally:
+                # Sinaliza fim para cada consumidor
+                for _ in range(concurrency):
+                    await queue.put(None)
+        
+        async def consumer():
+            while (item := await queue.get()) is not None:
+                batch_num, batch = item
+                await self._sync_batch(batch_num, batch, stats, synced_at, history_cutoff)
+        
+        await asyncio.gather(producer(), *[consumer() for _ in range(concurrency)])
+        
+        if stats['total'] == 0:
             self.logger.info("Nenhum bundle para sincronizar")
-            return {'total': 0, 'success': 0, 'failed': 0}
+        else:
+            self.logger.success(
+                f"Sincronização concluída: {stats['success']} sucesso, {stats['failed']} falhas"
+            )
+        self.logger.end_operation("Sincronização Supabase")
         
-        # Sincroniza
-        return self.sync_bundles(bundles)
+        return stats
     
-    def cleanup_old_bundles(self, days_old: int = 90):
+    def cleanup_old_bundles(self, days_old: int = 90, chunk_size: int = 500):
         """
         Remove bundles muito antigos do Supabase
         Mantém banco leve e focado em promoções atuais
         
+        Deleta em blocos de IDs para não estourar o timeout do PostgREST
+        nem segurar locks com um DELETE sem limite.
+        
         Args:
             days_old: Remove bundles não atualizados há X dias
+            chunk_size: Quantidade de bundles removidos por request
         """
         cutoff = datetime.utcnow() - timedelta(days=days_old)
         cutoff_str = cutoff.isoformat()
         
         try:
-            response = self.supabase.table('bundles').delete().lt(
-                'last_updated',
-                cutoff_str
-            ).execute()
+            removed = 0
+            for _ in range(CLEANUP_MAX_BATCHES):
+                rows = self.supabase.table('bundles').select('id').lt(
+                    'last_updated',
+                    cutoff_str
+                ).limit(chunk_size).execute().data
+                
+                if not rows:
+                    break
+                
+                deleted = self.supabase.table('bundles').delete(count='exact').in_(
+                    'id',
+                    [row['id'] for row in rows]
+                ).execute().count or 0
+                
+                removed += deleted
+                self.logger.info(f"Removidos {deleted} bundles antigos (total: {removed})")
+                
+                # Sem progresso (RLS, chave anon, filtro divergente): o próximo select traria os mesmos IDs
+                if deleted < len(rows):
+                    self.logger.warning(f"DELETE removeu {deleted}/{len(rows)} bundles - interrompendo limpeza")
+                    break
+                
+                # Página incompleta: não há mais bundles antigos
+                if len(rows) < chunk_size:
+                    break
+            else:
+                self.logger.warning(f"Limite de {CLEANUP_MAX_BATCHES} lotes atingido - limpeza interrompida")
             
-            self.logger.info(f"Bundles antigos removidos do Supabase")
+            self.logger.info(f"Bundles antigos removidos do Supabase: {removed}")
             
         except Exception as e:
             self.logger.error(f"Erro ao limpar bundles antigos: {e}")
@@ -263,13 +578,22 @@ class SupabaseSync:
         """
         self.logger.info(f"Sincronizando top {limit} deals...")
         
-        # Busca top bundles
-        top_bundles = await self.db.get_top_discounts(limit=limit)
+        timestamps = self._sync_timestamps()
+        
+        # Mesmos filtros de Database.get_top_discounts: top deals são reenviados mesmo sem mudança
+        top_bundles = await self.get_bundles_to_sync(
+            hours_ago=None,
+            only_with_discount=True,
+            limit=limit,
+            only_changed=False,
+            currency='BRL',
+            history_cutoff=timestamps[1]
+        )
         
         if not top_bundles:
             return {'total': 0, 'success': 0, 'failed': 0}
         
-        return self.sync_bundles(top_bundles)
+        return await self.sync_bundles(top_bundles, timestamps=timestamps)
     
     def test_connection(self) -> bool:
         """
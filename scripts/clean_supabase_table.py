@@ -7,6 +7,7 @@ Uso:
     python3 scripts/clean_supabase_table.py
 """
 
+import asyncio
 import os
 import sys
 from pathlib import Path
@@ -22,6 +23,17 @@ except ImportError:
     sys.exit(1)
 
 
+async def reset_local_sync_state():
+    """Zera o estado de sync local: sem isso o próximo sync pularia os bundles inalterados"""
+    from scraper.database import Database
+    
+    db = Database()
+    try:
+        await db.reset_sync_state()
+    finally:
+        await db.close()
+
+
 def clean_bundles_table():
     """Limpa todos os registros da tabela bundles"""
     
@@ -40,10 +52,10 @@ def clean_bundles_table():
     print("🔗 Conectando ao Supabase...")
     supabase: Client = create_client(supabase_url, supabase_key)
     
-    # Conta registros atuais
+    # Conta registros atuais (HEAD: só o total, sem trafegar os IDs)
     try:
-        result = supabase.table('bundles').select('id', count='exact').execute()
-        total = result.count if hasattr(result, 'count') else len(result.data)
+        result = supabase.table('bundles').select('id', count='exact', head=True).execute()
+        total = result.count or 0
         
         print(f"📊 Registros atuais na tabela: {total}")
         
@@ -62,21 +74,30 @@ def clean_bundles_table():
         print("")
         print("🗑️  Deletando todos os registros...")
         
-        # Delete usando range query (deleta tudo)
-        # Supabase não tem "delete all", então usamos um filtro que pega tudo
-        result = supabase.table('bundles').delete().neq('id', '').execute()
+        # TRUNCATE via RPC (um round trip, sem DELETE linha a linha)
+        # Requer scripts/migrations/003_truncate_bundles.sql aplicada no Supabase
+        supabase.rpc('truncate_bundles').execute()
         
         print("✅ Tabela 'bundles' limpa com sucesso!")
         
         # Verifica se realmente limpou
-        result = supabase.table('bundles').select('id', count='exact').execute()
-        remaining = result.count if hasattr(result, 'count') else len(result.data)
+        result = supabase.table('bundles').select('id', count='exact', head=True).execute()
+        remaining = result.count or 0
         
         if remaining == 0:
             print(f"✅ Verificação: 0 registros restantes")
         else:
             print(f"⚠️  Ainda existem {remaining} registros. Tente novamente.")
         
+        # Estado local (hashes do sync REST + synced_at) aponta para linhas que não existem mais
+        print("🔄 Zerando estado de sync no banco local...")
+        try:
+            asyncio.run(reset_local_sync_state())
+            print("✅ Próximo sync reenviará todos os bundles")
+        except Exception as e:
+            print(f"⚠️  Falha ao zerar estado de sync local: {e}")
+            print("   Rode no banco local: DELETE FROM sync_state; UPDATE bundles SET synced_at = NULL;")
+        
     except Exception as e:
         print(f"❌ Erro ao limpar tabela: {e}")
         sys.exit(1)
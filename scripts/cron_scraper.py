@@ -9,6 +9,7 @@ import sys
 import subprocess
 from pathlib import Path
 import fcntl
+import threading
 import time
 
 # Adiciona path do projeto
@@ -16,7 +17,6 @@ sys.path.insert(0, '/app')
 
 from scraper.database import Database
 from scraper.logger import Logger
-from sqlalchemy import select, func
 
 # Flag para indicar que primeira execução já foi feita
 FIRST_RUN_FLAG = Path('/app/data/.first_run_completed')
@@ -47,27 +47,33 @@ async def check_and_run():
         await db.init_db()
         logger.success("✅ Banco de dados inicializado!")
         
-        from scraper.database import BundleModel
-        async with db.async_session() as session:
-            result = await session.execute(select(func.count(BundleModel.id)))
-            total_bundles = result.scalar()
-        
-        is_first_run = (total_bundles == 0)
+        is_first_run = await db.is_empty()
         
         if is_first_run:
             logger.info("🎯 PRIMEIRA EXECUÇÃO DETECTADA!")
             logger.info("📋 Executando discovery completo...")
             
-            # Executa discovery E AGUARDA terminar
-            discovery_result = subprocess.run(
+            # Executa discovery E AGUARDA terminar (logs repassados em tempo real)
+            discovery = subprocess.Popen(
                 [sys.executable, '/app/scripts/discover_with_diff.py'],
-                capture_output=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
                 text=True,
-                timeout=1800  # 30 minutos de timeout
+                bufsize=1
             )
             
-            if discovery_result.returncode != 0:
-                logger.error(f"❌ Erro no discovery: {discovery_result.stderr}")
+            # 30 minutos de timeout: mata o processo, o que encerra a leitura do stdout
+            timeout = threading.Timer(1800, discovery.kill)
+            timeout.start()
+            try:
+                for line in discovery.stdout:
+                    logger.info(f"   {line.rstrip()}")
+                discovery.wait()
+            finally:
+                timeout.cancel()
+            
+            if discovery.returncode != 0:
+                logger.error(f"❌ Erro no discovery (código {discovery.returncode})")
                 return 1
             
             logger.success("✅ Discovery completo!")
@@ -76,7 +82,7 @@ async def check_and_run():
             FIRST_RUN_FLAG.touch()
             logger.info("✅ Flag de primeira execução criada")
         else:
-            logger.info(f"ℹ️  Banco já possui {total_bundles} bundles")
+            logger.info("ℹ️  Banco já possui bundles")
         
         # Agora executa o scraping normal
         logger.info("🚀 Iniciando scraping completo...")
@@ -10,7 +10,7 @@ Funcionalidades:
 """
 import sys
 import asyncio
-import json
+import orjson
 from pathlib import Path
 from datetime import datetime
 
@@ -31,8 +31,8 @@ async def discover_with_diff():
     old_ids = set()
     if json_file.exists():
         try:
-            with open(json_file, 'r') as f:
-                data = json.load(f)
+            with open(json_file, 'rb') as f:
+                data = orjson.loads(f.read())
                 old_ids = set(data.get('bundle_ids', []))
                 logger.info(f"Lista anterior: {len(old_ids)} bundles")
                 logger.info(f"Última atualização: {data.get('last_updated', 'desconhecido')}")
@@ -47,46 +47,53 @@ async def discover_with_diff():
         new_ids = set(new_ids_list)
     
     # Calcula diferenças
-    added = new_ids - old_ids
-    removed = old_ids - new_ids
-    unchanged = old_ids & new_ids
+    # Diferença simétrica em uma passada; added/removed só percorrem o que mudou
+    changed = new_ids ^ old_ids
+    added = changed & new_ids
+    removed = changed - added
+    unchanged_count = len(old_ids) - len(removed)
+    
+    # Ordena uma vez: reaproveitado nos logs e nos dois arquivos
+    sorted_ids = sorted(new_ids_list)
+    sorted_added = sorted(added)
+    sorted_removed = sorted(removed)
     
     logger.info("\n" + "=" * 60)
     logger.info("RESULTADO DA DESCOBERTA")
     logger.info("=" * 60)
     logger.info(f"Total de bundles encontrados: {len(new_ids)}")
-    logger.info(f"Bundles sem mudança: {len(unchanged)}")
+    logger.info(f"Bundles sem mudança: {unchanged_count}")
     
     if added:
         logger.success(f"NOVOS bundles: {len(added)}")
         if len(added) <= 20:
-            logger.info(f"IDs novos: {sorted(added)}")
+            logger.info(f"IDs novos: {sorted_added}")
         else:
-            logger.info(f"Primeiros 20: {sorted(list(added))[:20]}")
+            logger.info(f"Primeiros 20: {sorted_added[:20]}")
     
     if removed:
         logger.warning(f"Bundles REMOVIDOS: {len(removed)}")
         if len(removed) <= 20:
-            logger.info(f"IDs removidos: {sorted(removed)}")
+            logger.info(f"IDs removidos: {sorted_removed}")
         else:
-            logger.info(f"Primeiros 20: {sorted(list(removed))[:20]}")
+            logger.info(f"Primeiros 20: {sorted_removed[:20]}")
     
     # Salva resultado em JSON
     output_data = {
         'last_updated': datetime.utcnow().isoformat() + 'Z',
         'total': len(new_ids),
-        'bundle_ids': sorted(new_ids_list),
+        'bundle_ids': sorted_ids,
         'diff': {
-            'added': sorted(list(added)),
-            'removed': sorted(list(removed)),
+            'added': sorted_added,
+            'removed': sorted_removed,
             'added_count': len(added),
             'removed_count': len(removed)
         }
     }
     
     json_file.parent.mkdir(exist_ok=True)
-    with open(json_file, 'w', encoding='utf-8') as f:
-        json.dump(output_data, f, indent=2)
+    with open(json_file, 'wb') as f:
+        f.write(orjson.dumps(output_data, option=orjson.OPT_INDENT_2))
     
     logger.success(f"Arquivo atualizado: {json_file}")
     
@@ -95,14 +102,14 @@ async def discover_with_diff():
         diff_file = Path("data/bundle_changes.json")
         diff_data = {
             'timestamp': datetime.utcnow().isoformat() + 'Z',
-            'added': sorted(list(added)),
-            'removed': sorted(list(removed)),
+            'added': sorted_added,
+            'removed': sorted_removed,
             'added_count': len(added),
             'removed_count': len(removed)
         }
         
-        with open(diff_file, 'w', encoding='utf-8') as f:
-            json.dump(diff_data, f, indent=2)
+        with open(diff_file, 'wb') as f:
+            f.write(orjson.dumps(diff_data, option=orjson.OPT_INDENT_2))
         
         logger.info(f"Mudanças salvas em: {diff_file}")
     
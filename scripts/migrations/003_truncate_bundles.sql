@@ -0,0 +1,20 @@
+-- Migration 003: Função RPC para limpar a tabela bundles
+-- Data: 2025-11-23
+-- Descrição: TRUNCATE em um único round trip (usado por scripts/clean_supabase_table.py)
+--            em vez de DELETE linha a linha via PostgREST
+
+CREATE OR REPLACE FUNCTION truncate_bundles()
+RETURNS void
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    -- CASCADE: bundle_analytics referencia bundles (ON DELETE CASCADE)
+    TRUNCATE TABLE bundles CASCADE;
+$$;
+
+-- Apenas service role pode executar (nunca expor para anon/authenticated)
+REVOKE EXECUTE ON FUNCTION truncate_bundles() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION truncate_bundles() TO service_role;
+
+COMMENT ON FUNCTION truncate_bundles() IS 'Remove todos os bundles (e analytics) em uma única operação';
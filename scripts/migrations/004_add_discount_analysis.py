@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Migration 004: Adiciona coluna discount_analysis_json (banco local)
+Guarda o resultado de get_real_discount() calculado no save_bundle
+"""
+import asyncio
+import sys
+sys.path.insert(0, '/app')
+
+from sqlalchemy import text
+from scraper.database import Database
+from scraper.logger import Logger
+
+
+async def apply_migration():
+    logger = Logger('migration_004')
+    db = Database()
+    
+    logger.info("🔄 Aplicando migration 004: discount_analysis_json")
+    
+    async with db.async_session() as session:
+        try:
+            # Adiciona coluna no PostgreSQL local
+            await session.execute(text(
+                "ALTER TABLE bundles ADD COLUMN IF NOT EXISTS discount_analysis_json JSON"
+            ))
+            await session.commit()
+            logger.info("✅ Coluna discount_analysis_json criada no PostgreSQL local")
+            
+        except Exception as e:
+            logger.error(f"❌ Erro na migration local: {e}")
+            raise
+    
+    logger.info("✅ Migration 004 concluída com sucesso!")
+
+
+if __name__ == '__main__':
+    asyncio.run(apply_migration())
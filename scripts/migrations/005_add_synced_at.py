@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Migration 005: Adiciona coluna synced_at (banco local)
+Permite que o sync envie apenas bundles alterados desde o último envio
+"""
+import asyncio
+import sys
+sys.path.insert(0, '/app')
+
+from sqlalchemy import text
+from scraper.database import Database
+from scraper.logger import Logger
+
+
+async def apply_migration():
+    logger = Logger('migration_005')
+    db = Database()
+    
+    logger.info("🔄 Aplicando migration 005: synced_at")
+    
+    async with db.async_session() as session:
+        try:
+            # Adiciona coluna no PostgreSQL local
+            await session.execute(text(
+                "ALTER TABLE bundles ADD COLUMN IF NOT EXISTS synced_at TIMESTAMP"
+            ))
+            await session.commit()
+            logger.info("✅ Coluna synced_at criada no PostgreSQL local")
+            
+        except Exception as e:
+            logger.error(f"❌ Erro na migration local: {e}")
+            raise
+    
+    logger.info("✅ Migration 005 concluída com sucesso!")
+
+
+if __name__ == '__main__':
+    asyncio.run(apply_migration())
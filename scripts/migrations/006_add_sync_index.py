@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Migration 006: Índice parcial para a query do sync Supabase (banco local)
+Filtra is_valid, last_updated e ordena por discount sem Seq Scan + Sort
+"""
+import asyncio
+import sys
+sys.path.insert(0, '/app')
+
+from sqlalchemy import text
+from scraper.database import Database
+from scraper.logger import Logger
+
+
+async def apply_migration():
+    logger = Logger('migration_006')
+    db = Database()
+    
+    logger.info("🔄 Aplicando migration 006: idx_bundles_sync")
+    
+    try:
+        # CREATE INDEX CONCURRENTLY não pode rodar dentro de transação
+        async with db.engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_bundles_sync "
+                "ON bundles (last_updated DESC, discount DESC) "
+                "WHERE is_valid = true"
+            ))
+        logger.info("✅ Índice idx_bundles_sync criado no PostgreSQL local")
+        
+    except Exception as e:
+        logger.error(f"❌ Erro na migration local: {e}")
+        raise
+    
+    finally:
+        await db.close()
+    
+    logger.info("✅ Migration 006 concluída com sucesso!")
+
+
+if __name__ == '__main__':
+    asyncio.run(apply_migration())
@@ -9,12 +9,14 @@ Ideal para execução frequente (diária)
 """
 import sys
 import asyncio
-import json
 from pathlib import Path
 
+import orjson
+
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from scraper.scraper import BundleScraper
+from scraper.config import ScrapingConfig
 from scraper.database import Database
 from scraper.filters import BundleFilter
 from scraper.logger import Logger
@@ -32,12 +34,12 @@ async def scrape_incremental():
         logger.info("Execute discover_with_diff.py primeiro ou use main_with_db.py para scraping completo")
         return
     
-    # Carrega mudanças
-    with open(changes_file, 'r') as f:
-        changes = json.load(f)
+    # Carrega mudanças (orjson direto dos bytes, sem decodificar texto antes)
+    changes = orjson.loads(changes_file.read_bytes())
     
-    added = changes.get('added', [])
-    removed = changes.get('removed', [])
+    # Sets: IDs únicos, prontos para operações em lote
+    added = set(changes.get('added', []))
+    removed = set(changes.get('removed', []))
     
     logger.info(f"Mudanças detectadas em: {changes.get('timestamp', 'desconhecido')}")
     logger.info(f"Novos bundles: {len(added)}")
@@ -52,43 +54,73 @@ async def scrape_incremental():
     await db.init_db()
     
     try:
-        # Processa removidos (marca como inativos)
+        # Processa removidos (por enquanto apenas logamos, numa única linha)
+        # Soft delete futuro: um único UPDATE ... WHERE id IN (removed), nunca um por bundle
         if removed:
-            logger.info(f"\nMarcando {len(removed)} bundles como removidos...")
-            for bundle_id in removed:
-                try:
-                    # Aqui você pode implementar lógica de soft delete
-                    # Por enquanto apenas logamos
-                    logger.info(f"Bundle {bundle_id} foi removido da Steam")
-                except Exception as e:
-                    logger.error(f"Erro ao processar remoção {bundle_id}: {e}")
+            logger.info(f"\n{len(removed)} bundles foram removidos da Steam")
         
         # Scraping dos novos
         if added:
             logger.info(f"\nBuscando dados de {len(added)} bundles novos...")
             
+            # Pipeline: enquanto um lote é salvo no banco, o próximo já está sendo buscado
+            added_ids = list(added)
+            sub_batches = [
+                added_ids[i:i + ScrapingConfig.BATCH_SIZE]  # API aceita até 100 IDs por request
+                for i in range(0, len(added_ids), ScrapingConfig.BATCH_SIZE)
+            ]
+            queue: asyncio.Queue = asyncio.Queue(maxsize=2)
+            totals = {'scraped': 0, 'valid': 0, 'saved': 0, 'failed': 0}
+            filter_service = BundleFilter()
+            
+            async def producer(scraper):
+                try:
+                    for index, sub_batch in enumerate(sub_batches):
+                        bundles = await scraper.scrape_bundles_batch(sub_batch)
+                        totals['scraped'] += len(bundles)
+                        
+                        # Aplica filtros
+                        bundles = filter_service.filter_valid(bundles)
+                        totals['valid'] += len(bundles)
+                        
+                        if bundles:
+                            await queue.put(bundles)
+                        
+                        # Pequena pausa entre requests à API
+                        if index + 1 < len(sub_batches):
+                            await asyncio.sleep(ScrapingConfig.REQUEST_DELAY)
+                finally:
+                    await queue.put(None)  # Sinaliza fim para o consumidor
+            
+            async def consumer():
+                # Salva no banco (uma transação por lote em vez de uma por bundle)
+                while (bundles := await queue.get()) is not None:
+                    saved, failed_ids = await db.save_bundles_bulk(bundles)
+                    totals['saved'] += saved
+                    
+                    # Bundle com problema é registrado e pulado, sem abortar o scraping
+                    if failed_ids:
+                        totals['failed'] += len(failed_ids)
+                        logger.error(f"Erro ao salvar {len(failed_ids)} bundles: {', '.join(failed_ids)}")
+            
             async with BundleScraper() as scraper:
-                # Busca em batch para eficiência
-                bundles = await scraper.scrape_bundles_batch(added)
-                
-                logger.info(f"Extraídos {len(bundles)} bundles")
-                
-                # Aplica filtros
-                filter_service = BundleFilter()
-                bundles = filter_service.filter_valid(bundles)
+                tasks = {asyncio.create_task(producer(scraper)), asyncio.create_task(consumer())}
                 
-                logger.info(f"Após validação: {len(bundles)} bundles")
+                # Se um lado falhar, cancela o outro (evita produtor travado na fila cheia)
+                done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+                for task in pending:
+                    task.cancel()
                 
-                # Salva no banco
-                saved_count = 0
-                for bundle_data in bundles:
-                    try:
-                        await db.save_bundle(bundle_data)
-                        saved_count += 1
-                    except Exception as e:
-                        logger.error(f"Erro ao salvar bundle {bundle_data.get('id')}: {e}")
-                
-                logger.success(f"Salvos {saved_count} novos bundles no banco")
+                for task in done:
+                    if task.exception():
+                        logger.error(f"Erro ao buscar/salvar bundles: {task.exception()}")
+                        raise task.exception()
+            
+            logger.info(f"Extraídos {totals['scraped']} bundles")
+            logger.info(f"Após validação: {totals['valid']} bundles")
+            logger.success(f"Salvos {totals['saved']} novos bundles no banco")
+            if totals['failed']:
+                logger.warning(f"Falharam {totals['failed']} bundles (ver erros acima)")
         
         # Remove arquivo de mudanças após processar
         changes_file.unlink()
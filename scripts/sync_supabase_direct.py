@@ -5,24 +5,248 @@ Usa conexão PostgreSQL nativa (mais confiável que SDK)
 """
 import asyncio
 import os
-import json
-from datetime import datetime, timedelta
-from sqlalchemy import select, create_engine, text
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from sqlalchemy import (
+    select, text, table, column, event,
+    MetaData, Table, Column, String, Integer, Numeric, Boolean, DateTime
+)
+from sqlalchemy.dialects.postgresql import JSONB, insert as pg_insert
+from sqlalchemy.dialects.postgresql.asyncpg import dialect as asyncpg_dialect
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+import orjson
 import sys
 
 # Adiciona path do projeto
 sys.path.insert(0, '/app')
 
-from scraper.database import BundleModel
+from scraper.database import BundleModel, analyze_discount, PRICE_HISTORY_LIMIT
 from scraper.logger import Logger
 
 
+# Tabela bundles do Supabase (ver supabase_schema.sql) - difere do BundleModel local
+supabase_bundles = Table(
+    'bundles', MetaData(),
+    Column('id', String, primary_key=True),
+    Column('name', String),
+    Column('url', String),
+    Column('image_url', String),
+    Column('final_price', Numeric),
+    Column('original_price', Numeric),
+    Column('discount', Integer),
+    Column('currency', String),
+    Column('games', JSONB),
+    Column('games_count', Integer),
+    Column('is_valid', Boolean),
+    Column('is_discount_real', Boolean),
+    Column('discount_analysis', String),
+    Column('price_history', JSONB),
+    Column('first_seen', DateTime(timezone=True)),
+    Column('last_updated', DateTime(timezone=True)),
+    Column('synced_at', DateTime(timezone=True)),
+)
+
+SYNC_COLUMN_NAMES = [c.name for c in supabase_bundles.columns]
+
+# Colunas preservadas quando o bundle já existe no Supabase
+UPSERT_KEEP_COLUMNS = ('id', 'first_seen')
+
+# Tabela temporária de staging: recebe o lote via COPY binário e some no COMMIT
+STAGE_TABLE = 'bundles_stage'
+CREATE_STAGE_SQL = text(
+    f"CREATE TEMP TABLE {STAGE_TABLE} (LIKE bundles INCLUDING DEFAULTS) ON COMMIT DROP"
+)
+
+
+def on_conflict_update(stmt):
+    """ON CONFLICT (id) DO UPDATE de todas as colunas, menos as preservadas"""
+    return stmt.on_conflict_do_update(
+        index_elements=['id'],
+        set_={c.name: c for c in stmt.excluded if c.name not in UPSERT_KEEP_COLUMNS}
+    )
+
+
+def build_upsert_from_stage():
+    """INSERT INTO bundles SELECT ... FROM staging ON CONFLICT (id) DO UPDATE (tudo no servidor)"""
+    stage = table(STAGE_TABLE, *[column(name) for name in SYNC_COLUMN_NAMES])
+    return on_conflict_update(
+        pg_insert(supabase_bundles).from_select(SYNC_COLUMN_NAMES, select(stage))
+    )
+
+
+UPSERT_FROM_STAGE = build_upsert_from_stage()
+
+# Mesmo upsert linha a linha com placeholders posicionais ($1..$17 na ordem de SYNC_COLUMN_NAMES)
+# Compilado uma única vez no import; nenhum SQL é montado por lote
+UPSERT_POSITIONAL_SQL = str(
+    on_conflict_update(pg_insert(supabase_bundles)).compile(dialect=asyncpg_dialect())
+)
+
+
+# Colunas lidas do banco local (select colunar: sem hidratar objetos ORM)
+LOCAL_COLUMNS = (
+    BundleModel.id,
+    BundleModel.name,
+    BundleModel.url,
+    BundleModel.image_url,
+    BundleModel.final_price,
+    BundleModel.original_price,
+    BundleModel.discount,
+    BundleModel.currency,
+    BundleModel.games,
+    BundleModel.games_count,
+    BundleModel.is_valid,
+    BundleModel.price_history,
+    BundleModel.discount_analysis_json,
+    BundleModel.first_seen,
+    BundleModel.last_updated,
+)
+
+
+def _as_utc(value):
+    """Marca datetimes naive (gravados em UTC no banco local) como UTC para colunas timestamptz"""
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _as_numeric(value):
+    """Float -> Decimal pela repr curta (19.99, não a expansão binária exata que o asyncpg gravaria no NUMERIC)"""
+    if value is None:
+        return None
+    return Decimal(str(value))
+
+
+def bundle_to_record(bundle, discount_analysis, synced_at):
+    """Tupla na ordem de SYNC_COLUMN_NAMES (formato do COPY) a partir de uma linha de LOCAL_COLUMNS"""
+    return (
+        bundle['id'],
+        bundle['name'],
+        bundle['url'],
+        bundle['image_url'],
+        _as_numeric(bundle['final_price']),
+        _as_numeric(bundle['original_price']),
+        bundle['discount'],
+        bundle['currency'],
+        bundle['games'] or [],  # jsonb: serializado pelo codec orjson da conexão
+        bundle['games_count'],
+        bundle['is_valid'],
+        discount_analysis.get('is_real', True),
+        discount_analysis.get('reason', ''),
+        (bundle['price_history'] or [])[-PRICE_HISTORY_LIMIT:],  # Linhas antigas ainda não re-salvas podem exceder o limite
+        _as_utc(bundle['first_seen']),  # asyncpg trataria naive como hora local (TZ do container)
+        _as_utc(bundle['last_updated']),
+        synced_at
+    )
+
+
+async def _set_jsonb_codec(pg_connection):
+    """jsonb em formato binário (byte de versão 1 + JSON) serializado com orjson"""
+    await pg_connection.set_type_codec(
+        'jsonb',
+        schema='pg_catalog',
+        encoder=lambda value: b'\x01' + orjson.dumps(value),
+        decoder=lambda data: orjson.loads(data[1:]),
+        format='binary'
+    )
+
+
+def register_jsonb_codec(engine):
+    """
+    Registra o codec jsonb orjson em cada conexão nova do engine
+    
+    Substitui o codec do dialeto asyncpg do SQLAlchemy (que espera texto JSON):
+    os valores jsonb só passam pelo asyncpg (COPY/executemany), nunca por binds do SQLAlchemy
+    """
+    @event.listens_for(engine.sync_engine, 'connect')
+    def _on_connect(dbapi_connection, connection_record):
+        dbapi_connection.run_async(_set_jsonb_codec)
+
+
+async def copy_upsert(conn, records):
+    """
+    COPY binário do lote para a staging + um único INSERT ... ON CONFLICT no servidor
+    Deve rodar dentro de uma transação (a staging é descartada no COMMIT/ROLLBACK)
+    """
+    await conn.execute(CREATE_STAGE_SQL)
+    
+    raw_connection = await conn.get_raw_connection()
+    await raw_connection.driver_connection.copy_records_to_table(
+        STAGE_TABLE,
+        records=records,
+        columns=SYNC_COLUMN_NAMES
+    )
+    
+    await conn.execute(UPSERT_FROM_STAGE)
+
+
+async def prepared_upsert(conn, records):
+    """
+    Fallback sem COPY: INSERT ... ON CONFLICT com executemany do asyncpg (binds em pipeline, atômico)
+    
+    Connection.executemany usa o cache de statements da conexão: o SQL é preparado
+    uma vez por conexão do pool e reaproveitado nos lotes seguintes
+    (Connection.prepare() não usa o cache e prepararia de novo a cada lote)
+    """
+    raw_connection = await conn.get_raw_connection()
+    await raw_connection.driver_connection.executemany(UPSERT_POSITIONAL_SQL, records)
+
+
+# Parâmetros do envio
+BATCH_SIZE = 1000  # Bundles por COPY (unidade de retry e de leitura do banco local)
+MAX_IN_FLIGHT = 2  # Lotes enviando ao Supabase enquanto o próximo é lido
+MAX_RETRIES = 3
+RETRY_DELAY = 5  # segundos
+
+
+async def sync_batch(supabase_engine, batch, batch_num, stats, logger):
+    """Envia um lote ao Supabase com retry (COPY + upsert numa transação)"""
+    # Análises de desconto fora do loop de envio (pré-calculadas no save; recalcula só linhas antigas)
+    analyses = [
+        bundle['discount_analysis_json'] or analyze_discount(bundle['price_history'], bundle['original_price'])
+        for bundle in batch
+    ]
+    
+    logger.info(f"📦 Sincronizando batch {batch_num} ({len(batch)} bundles)...")
+    
+    # Registros montados uma vez por lote (mesmo synced_at para todos, reaproveitados nos retries)
+    synced_at = datetime.now(timezone.utc)
+    records = [
+        bundle_to_record(bundle, analysis, synced_at)
+        for bundle, analysis in zip(batch, analyses)
+    ]
+    
+    for attempt in range(1, MAX_RETRIES + 1):
+        # COPY na primeira tentativa; se falhar, as novas tentativas usam o INSERT preparado
+        upsert = copy_upsert if attempt == 1 else prepared_upsert
+        
+        try:
+            async with supabase_engine.begin() as supabase_conn:
+                await upsert(supabase_conn, records)
+            
+            stats['synced'] += len(batch)
+            logger.success(f"✅ Batch {batch_num}: {len(batch)} bundles sincronizados (Total: {stats['synced']})")
+            return
+            
+        except Exception as e:
+            if attempt < MAX_RETRIES:
+                wait_time = RETRY_DELAY * attempt  # Backoff exponencial
+                logger.warning(f"⚠️  Tentativa {attempt}/{MAX_RETRIES} falhou para batch {batch_num}: {e}")
+                logger.info(f"🔄 Aguardando {wait_time}s antes de tentar novamente...")
+                await asyncio.sleep(wait_time)
+            else:
+                logger.error(f"❌ Batch {batch_num} falhou após {MAX_RETRIES} tentativas: {e}")
+                stats['errors'] += len(batch)
+
+
 async def sync_to_supabase():
     """
     Sincroniza bundles do PostgreSQL local → Supabase PostgreSQL
-    Usa INSERT ... ON CONFLICT UPDATE (upsert nativo)
+    Usa COPY para tabela temporária + INSERT ... ON CONFLICT UPDATE (upsert nativo)
+    
+    Lê o banco local em streaming (cursor no servidor) e envia cada lote
+    enquanto o próximo é lido: memória O(BATCH_SIZE × MAX_IN_FLIGHT)
     """
     logger = Logger('supabase_sync_direct')
     
@@ -40,140 +264,69 @@ async def sync_to_supabase():
     
     try:
         # Engines
-        local_engine = create_async_engine(local_db_url, echo=False)
-        supabase_engine = create_async_engine(supabase_db_url, echo=False)
+        local_engine = create_async_engine(
+            local_db_url,
+            echo=False,
+            pool_pre_ping=True,
+            pool_size=1,  # Só o cursor de leitura em streaming
+            max_overflow=1,
+            pool_recycle=1800
+        )
+        supabase_engine = create_async_engine(
+            supabase_db_url,
+            echo=False,
+            pool_pre_ping=True,  # Pooler do Supabase derruba conexões ociosas
+            pool_size=MAX_IN_FLIGHT,  # Uma conexão por lote em envio (sem esgotar ~15 do pooler)
+            max_overflow=1,
+            pool_recycle=1800,  # Recicla antes do timeout de inatividade
+            pool_timeout=30
+        )
+        register_jsonb_codec(supabase_engine)
         
         # Sessions
         LocalSession = sessionmaker(local_engine, class_=AsyncSession, expire_on_commit=False)
-        SupabaseSession = sessionmaker(supabase_engine, class_=AsyncSession, expire_on_commit=False)
         
-        # Busca bundles do banco local (últimas 48h, apenas válidos)
+        stats = {'synced': 0, 'errors': 0}
+        total = 0
+        tasks = []
+        in_flight = asyncio.Semaphore(MAX_IN_FLIGHT)
+        
+        async def send(batch, batch_num):
+            try:
+                await sync_batch(supabase_engine, batch, batch_num, stats, logger)
+            finally:
+                in_flight.release()
+        
+        # Busca bundles do banco local (últimas 48h, apenas válidos) em streaming
         async with LocalSession() as local_session:
             cutoff = datetime.utcnow() - timedelta(hours=48)
             
-            query = select(BundleModel).where(
+            query = select(*LOCAL_COLUMNS).where(
                 BundleModel.last_updated >= cutoff,
                 BundleModel.is_valid == True
-            ).order_by(BundleModel.discount.desc())
+            ).order_by(BundleModel.discount.desc()).execution_options(yield_per=BATCH_SIZE)
             
-            result = await local_session.execute(query)
-            bundles = result.scalars().all()
+            result = await local_session.stream(query)
             
-            logger.info(f"📦 Encontrados {len(bundles)} bundles para sync")
+            async for batch in result.mappings().partitions():
+                total += len(batch)
+                
+                # Espera vaga antes de ler o próximo lote (limita memória e conexões)
+                await in_flight.acquire()
+                tasks.append(asyncio.create_task(send(batch, len(tasks) + 1)))
             
-            if not bundles:
-                logger.info("✅ Nenhum bundle novo para sincronizar")
-                return
+            await asyncio.gather(*tasks)
         
-        # Envia para Supabase com BULK UPSERT (muito mais rápido!) + RETRY
-        synced = 0
-        errors = 0
-        batch_size = 500  # Insere 500 bundles por vez
-        max_retries = 3
-        retry_delay = 5  # segundos
+        logger.info(f"📦 Encontrados {total} bundles para sync")
         
-        for i in range(0, len(bundles), batch_size):
-            batch = bundles[i:i + batch_size]
-            batch_num = i // batch_size + 1
-            
-            logger.info(f"📦 Sincronizando batch {batch_num} ({len(batch)} bundles)...")
-            
-            # Retry loop
-            for attempt in range(1, max_retries + 1):
-                try:
-                    async with SupabaseSession() as supabase_session:
-                        # Prepara todos os valores do batch
-                        values_list = []
-                        for bundle in batch:
-                            discount_analysis = bundle.get_real_discount()
-                            values_list.append({
-                                'id': bundle.id,
-                                'name': bundle.name,
-                                'url': bundle.url,
-                                'image_url': bundle.image_url,
-                                'final_price': bundle.final_price,
-                                'original_price': bundle.original_price,
-                                'discount': bundle.discount,
-                                'currency': bundle.currency,
-                                'games': json.dumps(bundle.games) if bundle.games else '[]',
-                                'games_count': bundle.games_count,
-                                'is_valid': bundle.is_valid,
-                                'is_discount_real': discount_analysis.get('is_real', True),
-                                'discount_analysis': discount_analysis.get('reason', ''),
-                                'price_history': json.dumps(bundle.price_history[:30] if bundle.price_history else []),
-                                'first_seen': bundle.first_seen,
-                                'last_updated': bundle.last_updated,
-                                'synced_at': datetime.utcnow()
-                            })
-                        
-                        # Cria placeholders para bulk insert
-                        placeholders = []
-                        for idx in range(len(values_list)):
-                            base = idx * 17  # 17 campos por bundle
-                            placeholders.append(f"(${base+1}, ${base+2}, ${base+3}, ${base+4}, ${base+5}, ${base+6}, ${base+7}, ${base+8}, ${base+9}, ${base+10}, ${base+11}, ${base+12}, ${base+13}, ${base+14}, ${base+15}, ${base+16}, ${base+17})")
-                        
-                        # SQL BULK UPSERT
-                        bulk_upsert_sql = f"""
-                            INSERT INTO bundles (
-                                id, name, url, image_url,
-                                final_price, original_price, discount, currency,
-                                games, games_count,
-                                is_valid, is_discount_real, discount_analysis,
-                                price_history, first_seen, last_updated, synced_at
-                            ) VALUES {', '.join(placeholders)}
-                            ON CONFLICT (id) DO UPDATE SET
-                                name = EXCLUDED.name,
-                                url = EXCLUDED.url,
-                                image_url = EXCLUDED.image_url,
-                                final_price = EXCLUDED.final_price,
-                                original_price = EXCLUDED.original_price,
-                                discount = EXCLUDED.discount,
-                                currency = EXCLUDED.currency,
-                                games = EXCLUDED.games,
-                                games_count = EXCLUDED.games_count,
-                                is_valid = EXCLUDED.is_valid,
-                                is_discount_real = EXCLUDED.is_discount_real,
-                                discount_analysis = EXCLUDED.discount_analysis,
-                                price_history = EXCLUDED.price_history,
-                                last_updated = EXCLUDED.last_updated,
-                                synced_at = EXCLUDED.synced_at
-                        """
-                        
-                        # Flatten values para executar
-                        flat_values = []
-                        for bundle_values in values_list:
-                            flat_values.extend([
-                                bundle_values['id'], bundle_values['name'], bundle_values['url'], 
-                                bundle_values['image_url'], bundle_values['final_price'], 
-                                bundle_values['original_price'], bundle_values['discount'], 
-                                bundle_values['currency'], bundle_values['games'], 
-                                bundle_values['games_count'], bundle_values['is_valid'], 
-                                bundle_values['is_discount_real'], bundle_values['discount_analysis'],
-                                bundle_values['price_history'], bundle_values['first_seen'],
-                                bundle_values['last_updated'], bundle_values['synced_at']
-                            ])
-                        
-                        await supabase_session.execute(text(bulk_upsert_sql), flat_values)
-                        await supabase_session.commit()
-                        
-                        synced += len(batch)
-                        logger.success(f"✅ Batch {batch_num}: {len(batch)} bundles sincronizados (Total: {synced}/{len(bundles)})")
-                        break  # Sucesso, sai do loop de retry
-                        
-                except Exception as e:
-                    if attempt < max_retries:
-                        wait_time = retry_delay * attempt  # Backoff exponencial
-                        logger.warning(f"⚠️  Tentativa {attempt}/{max_retries} falhou para batch {batch_num}: {e}")
-                        logger.info(f"🔄 Aguardando {wait_time}s antes de tentar novamente...")
-                        await asyncio.sleep(wait_time)
-                    else:
-                        logger.error(f"❌ Batch {batch_num} falhou após {max_retries} tentativas: {e}")
-                        errors += len(batch)
+        if not total:
+            logger.info("✅ Nenhum bundle novo para sincronizar")
+            return
         
         logger.info(f"✅ Sync completo!")
-        logger.info(f"   → Sincronizados: {synced}")
-        logger.info(f"   → Erros: {errors}")
-        logger.info(f"   → Taxa de sucesso: {(synced/len(bundles)*100):.1f}%")
+        logger.info(f"   → Sincronizados: {stats['synced']}")
+        logger.info(f"   → Erros: {stats['errors']}")
+        logger.info(f"   → Taxa de sucesso: {(stats['synced']/total*100):.1f}%")
     
     except Exception as e:
         logger.error(f"❌ Erro fatal no sync: {e}")
@@ -3,8 +3,10 @@ Sync via Supabase REST API (mais confiável que PostgreSQL direto)
 Usa HTTPS que sempre funciona, mesmo sem IPv6
 """
 import asyncio
+import hashlib
 import os
 import sys
+from datetime import datetime, timedelta
 from typing import List, Dict
 from pathlib import Path
 
@@ -12,13 +14,133 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from scraper.logger import Logger
-from scraper.database import Database
+from scraper.database import Database, BundleModel
 import aiohttp
-import json
+import orjson
+
+# Reenvia mesmo sem mudança depois desse tempo (mantém last_updated do Supabase atualizado)
+RESEND_AFTER = timedelta(hours=12)
+
+
+def payload_hash(bundle_dict: Dict) -> bytes:
+    """
+    Hash do payload enviado ao Supabase
+    
+    last_updated fica de fora: muda a cada scraping mesmo sem alteração no bundle
+    """
+    content = {k: v for k, v in bundle_dict.items() if k != 'last_updated'}
+    return hashlib.blake2b(orjson.dumps(content, option=orjson.OPT_SORT_KEYS), digest_size=16).digest()
+
+
+# Colunas enviadas via REST (select colunar: sem hidratar objetos ORM)
+REST_COLUMNS = (
+    BundleModel.id,
+    BundleModel.name,
+    BundleModel.final_price,
+    BundleModel.original_price,
+    BundleModel.currency,
+    BundleModel.discount,
+    BundleModel.games,
+    BundleModel.games_count,
+    BundleModel.url,
+    BundleModel.image_url,
+    BundleModel.last_updated,
+)
+
+BATCH_SIZE = 500  # Bundles por POST (unidade de retry e de leitura do banco local)
+MAX_IN_FLIGHT = 4  # Lotes enviando ao Supabase enquanto o próximo é lido
+
+# Conexões HTTPS reaproveitadas entre os lotes (evita novo handshake TLS por POST)
+CONNECTOR_LIMIT = 8
+KEEPALIVE_TIMEOUT = 60  # segundos
+DNS_CACHE_TTL = 300  # segundos
+MAX_RETRIES = 3
+
+
+def bundle_to_dict(bundle) -> Dict:
+    """Converte linha de REST_COLUMNS para o payload da REST API"""
+    last_updated = bundle['last_updated']
+    return {**bundle, 'last_updated': last_updated.isoformat() if last_updated else None}
+
+
+async def sync_batch(http_session, db, rest_url, headers, batch, batch_num, logger) -> Dict[str, int]:
+    """
+    Envia ao Supabase os bundles alterados de um lote (com retry)
+    
+    Returns:
+        Contagem do lote: synced, skipped e failed
+    """
+    logger.info(f"📦 Sincronizando batch {batch_num} ({len(batch)} bundles)...")
+    
+    bundle_dicts = [bundle_to_dict(bundle) for bundle in batch]
+    
+    # Só envia bundles cujo payload mudou desde o último sync
+    now = datetime.utcnow()
+    hashes = {d['id']: payload_hash(d) for d in bundle_dicts}
+    sync_state = await db.get_sync_state(list(hashes))
+    
+    changed = []
+    for bundle_dict in bundle_dicts:
+        previous = sync_state.get(bundle_dict['id'])
+        if (
+            previous is None
+            or previous[0] != hashes[bundle_dict['id']]
+            or previous[1] < now - RESEND_AFTER
+        ):
+            changed.append(bundle_dict)
+    
+    skipped = len(bundle_dicts) - len(changed)
+    
+    if not changed:
+        logger.info(f"⏭️  Batch {batch_num}: nenhum bundle alterado, pulando")
+        return {'synced': 0, 'skipped': skipped, 'failed': 0}
+    
+    if skipped:
+        logger.info(f"⏭️  Batch {batch_num}: {skipped} bundles sem alteração, enviando {len(changed)}")
+    
+    # Retry logic
+    for attempt in range(MAX_RETRIES):
+        try:
+            async with http_session.post(
+                rest_url,
+                headers=headers,
+                data=orjson.dumps(changed),  # Content-Type já vem nos headers
+                timeout=aiohttp.ClientTimeout(total=60)
+            ) as response:
+                if response.status in (200, 201):
+                    await db.save_sync_state(
+                        {d['id']: hashes[d['id']] for d in changed},
+                        now
+                    )
+                    logger.success(f"✅ Batch {batch_num} sincronizado ({len(changed)} bundles)")
+                    return {'synced': len(changed), 'skipped': skipped, 'failed': 0}
+                else:
+                    error_text = await response.text()
+                    logger.warning(f"⚠️  Tentativa {attempt + 1}/{MAX_RETRIES}: HTTP {response.status} - {error_text[:200]}")
+                    
+                    if attempt < MAX_RETRIES - 1:
+                        await asyncio.sleep(5 * (attempt + 1))
+                    else:
+                        logger.error(f"❌ Batch {batch_num} falhou após {MAX_RETRIES} tentativas")
+        
+        except Exception as e:
+            logger.warning(f"⚠️  Tentativa {attempt + 1}/{MAX_RETRIES} falhou: {e}")
+            
+            if attempt < MAX_RETRIES - 1:
+                await asyncio.sleep(5 * (attempt + 1))
+            else:
+                logger.error(f"❌ Batch {batch_num} falhou: {e}")
+    
+    return {'synced': 0, 'skipped': skipped, 'failed': len(changed)}
 
 
 async def sync_to_supabase_rest():
-    """Sincroniza bundles usando Supabase REST API"""
+    """
+    Sincroniza bundles usando Supabase REST API
+    
+    Lê o banco local em streaming e envia cada lote enquanto o próximo é lido
+    (memória O(BATCH_SIZE × MAX_IN_FLIGHT) em vez de todos os bundles)
+    """
     logger = Logger('supabase_sync_rest')
     
     # Configuração
@@ -37,105 +159,83 @@ async def sync_to_supabase_rest():
     await db.init_db()
     
     try:
-        # Busca todos os bundles do banco local
-        async with db.async_session() as session:
-            from sqlalchemy import select
-            from scraper.database import BundleModel
-            
-            result = await session.execute(select(BundleModel))
-            bundles = result.scalars().all()
-            
-            logger.info(f"📦 Encontrados {len(bundles)} bundles para sync")
+        # Headers para autenticação
+        headers = {
+            'apikey': service_key,
+            'Authorization': f'Bearer {service_key}',
+            'Content-Type': 'application/json',
+            'Prefer': 'resolution=merge-duplicates'
+        }
+        
+        # URL da REST API
+        rest_url = f"{supabase_url}/rest/v1/bundles"
+        
+        stats = {'synced': 0, 'failed': 0, 'skipped': 0}
+        total = 0
+        tasks = []
+        batch_sizes = []
+        in_flight = asyncio.Semaphore(MAX_IN_FLIGHT)
+        
+        # Respostas já vêm com gzip (aiohttp envia Accept-Encoding por padrão);
+        # o corpo do POST segue sem compressão: o PostgREST não descomprime requisições
+        connector = aiohttp.TCPConnector(
+            limit=CONNECTOR_LIMIT,
+            ttl_dns_cache=DNS_CACHE_TTL,
+            keepalive_timeout=KEEPALIVE_TIMEOUT
+        )
+        
+        async with aiohttp.ClientSession(connector=connector) as http_session:
             
-            if len(bundles) == 0:
-                logger.warning("⚠️  Nenhum bundle para sincronizar")
-                return 0
+            async def send(batch, batch_num):
+                try:
+                    return await sync_batch(http_session, db, rest_url, headers, batch, batch_num, logger)
+                finally:
+                    in_flight.release()
             
-            # Prepara dados para upsert
-            batch_size = 500
-            total_synced = 0
-            total_failed = 0
-            
-            # Headers para autenticação
-            headers = {
-                'apikey': service_key,
-                'Authorization': f'Bearer {service_key}',
-                'Content-Type': 'application/json',
-                'Prefer': 'resolution=merge-duplicates'
-            }
-            
-            # URL da REST API
-            rest_url = f"{supabase_url}/rest/v1/bundles"
-            
-            async with aiohttp.ClientSession() as http_session:
-                for i in range(0, len(bundles), batch_size):
-                    batch = bundles[i:i + batch_size]
-                    batch_num = (i // batch_size) + 1
-                    
-                    logger.info(f"📦 Sincronizando batch {batch_num} ({len(batch)} bundles)...")
+            # Busca todos os bundles do banco local em streaming
+            async with db.async_session() as session:
+                from sqlalchemy import select
+                
+                result = await session.stream(
+                    select(*REST_COLUMNS).execution_options(yield_per=BATCH_SIZE)
+                )
+                
+                async for batch in result.mappings().partitions():
+                    total += len(batch)
                     
-                    # Converte para dict
-                    bundle_dicts = []
-                    for bundle in batch:
-                        bundle_dict = {
-                            'id': bundle.id,
-                            'name': bundle.name,
-                            'final_price': bundle.final_price,
-                            'original_price': bundle.original_price,
-                            'currency': bundle.currency,
-                            'discount': bundle.discount,
-                            'games': bundle.games,
-                            'games_count': bundle.games_count,
-                            'url': bundle.url,
-                            'image_url': bundle.image_url,
-                            'last_updated': bundle.last_updated.isoformat() if bundle.last_updated else None
-                        }
-                        bundle_dicts.append(bundle_dict)
-                    
-                    # Retry logic
-                    for attempt in range(3):
-                        try:
-                            async with http_session.post(
-                                rest_url,
-                                headers=headers,
-                                json=bundle_dicts,
-                                timeout=aiohttp.ClientTimeout(total=60)
-                            ) as response:
-                                if response.status in (200, 201):
-                                    total_synced += len(batch)
-                                    logger.success(f"✅ Batch {batch_num} sincronizado ({len(batch)} bundles)")
-                                    break
-                                else:
-                                    error_text = await response.text()
-                                    logger.warning(f"⚠️  Tentativa {attempt + 1}/3: HTTP {response.status} - {error_text[:200]}")
-                                    
-                                    if attempt < 2:
-                                        await asyncio.sleep(5 * (attempt + 1))
-                                    else:
-                                        logger.error(f"❌ Batch {batch_num} falhou após 3 tentativas")
-                                        total_failed += len(batch)
-                        
-                        except Exception as e:
-                            logger.warning(f"⚠️  Tentativa {attempt + 1}/3 falhou: {e}")
-                            
-                            if attempt < 2:
-                                await asyncio.sleep(5 * (attempt + 1))
-                            else:
-                                logger.error(f"❌ Batch {batch_num} falhou: {e}")
-                                total_failed += len(batch)
-                    
-                    # Progress
-                    progress = (total_synced / len(bundles)) * 100
-                    logger.info(f"📊 Progresso: {total_synced}/{len(bundles)} ({progress:.1f}%)")
-            
-            logger.success(f"✅ Sync completo!")
-            logger.info(f"📊 Total sincronizado: {total_synced}")
-            
-            if total_failed > 0:
-                logger.warning(f"⚠️  Total com falha: {total_failed}")
-                return 1
+                    # Espera vaga antes de ler o próximo lote (limita memória e conexões)
+                    await in_flight.acquire()
+                    tasks.append(asyncio.create_task(send(batch, len(tasks) + 1)))
+                    batch_sizes.append(len(batch))
+                
+                # return_exceptions: um lote com erro inesperado não derruba os demais
+                results = await asyncio.gather(*tasks, return_exceptions=True)
+        
+        # Consolida contagens dos lotes
+        for batch_num, (size, result) in enumerate(zip(batch_sizes, results), start=1):
+            if isinstance(result, BaseException):
+                logger.error(f"❌ Batch {batch_num} falhou: {result}")
+                stats['failed'] += size
+                continue
             
+            for key, count in result.items():
+                stats[key] += count
+        
+        logger.info(f"📦 Encontrados {total} bundles para sync")
+        
+        if total == 0:
+            logger.warning("⚠️  Nenhum bundle para sincronizar")
             return 0
+        
+        logger.success(f"✅ Sync completo!")
+        logger.info(f"📊 Total sincronizado: {stats['synced']}")
+        logger.info(f"⏭️  Sem alteração (não enviados): {stats['skipped']}")
+        
+        if stats['failed'] > 0:
+            logger.warning(f"⚠️  Total com falha: {stats['failed']}")
+            return 1
+        
+        return 0
     
     except Exception as e:
         logger.error(f"❌ Erro durante sync: {e}")
@@ -4,6 +4,7 @@ Teste de conexão com Supabase
 Verifica se as credenciais estão corretas
 """
 import os
+from functools import lru_cache
 from supabase import create_client
 
 # Pega do ambiente
@@ -20,17 +21,25 @@ if not SUPABASE_KEY:
     print("❌ SUPABASE_SERVICE_KEY não configurada!")
     exit(1)
 
+
+@lru_cache(maxsize=1)
+def _client():
+    """Cliente Supabase único (reaproveita conexão/TLS entre chamadas)"""
+    return create_client(SUPABASE_URL, SUPABASE_KEY)
+
+
 try:
     # Tenta conectar
-    supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+    supabase = _client()
     
     # Testa listagem da tabela
     print("✅ Cliente criado com sucesso!")
-    print("🔍 Testando acesso à tabela 'steam_bundles'...")
+    print("🔍 Testando acesso à tabela 'bundles'...")
     
-    result = supabase.table('steam_bundles').select('id').limit(1).execute()
+    # HEAD: só status + contagem estimada (planner), nenhuma linha trafega
+    result = supabase.table('bundles').select('id', count='planned', head=True).execute()
     
-    print(f"✅ Conexão OK! Encontrados {len(result.data)} registros (teste)")
+    print(f"✅ Conexão OK! ~{result.count or 0} registros (estimativa)")
     print(f"📊 Estrutura da resposta: {type(result)}")
     
 except Exception as e:
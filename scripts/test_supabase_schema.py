@@ -18,11 +18,18 @@ async def test_schema():
     
     try:
         async with engine.connect() as conn:
-            # Verifica colunas da tabela bundles
+            # Colunas + estimativa de linhas numa única query (reltuples do catálogo, sem COUNT(*))
             result = await conn.execute(text("""
-                SELECT column_name, data_type 
-                FROM information_schema.columns 
-                WHERE table_name = 'bundles'
+                WITH cols AS (
+                    SELECT column_name, data_type, ordinal_position
+                    FROM information_schema.columns
+                    WHERE table_schema = 'public' AND table_name = 'bundles'
+                )
+                SELECT column_name, data_type,
+                       (SELECT reltuples::bigint FROM pg_class
+                        WHERE relname = 'bundles'
+                          AND relnamespace = 'public'::regnamespace) AS estimate
+                FROM cols
                 ORDER BY ordinal_position;
             """))
             
@@ -30,20 +37,21 @@ async def test_schema():
             
             print("📋 Estrutura da tabela 'bundles' no Supabase:")
             print("-" * 60)
+            has_image_url = False
             for col in columns:
-                print(f"  - {col[0]:20s} : {col[1]}")
+                print(f"  - {col.column_name:20s} : {col.data_type}")
+                has_image_url = has_image_url or col.column_name == 'image_url'
             print("-" * 60)
             
-            # Verifica se image_url existe
-            has_image_url = any(col[0] == 'image_url' for col in columns)
-            
             if has_image_url:
                 print("✅ Coluna 'image_url' encontrada!")
                 
-                # Verifica quantidade de bundles
-                count_result = await conn.execute(text("SELECT COUNT(*) FROM bundles;"))
-                count = count_result.scalar()
-                print(f"📊 Total de bundles no Supabase: {count}")
+                # Estimativa do planner (-1 = tabela ainda não analisada)
+                estimate = columns[0].estimate
+                if estimate is not None and estimate >= 0:
+                    print(f"📊 Total de bundles no Supabase: ~{estimate}")
+                else:
+                    print("📊 Total de bundles no Supabase: desconhecido (rode ANALYZE bundles)")
             else:
                 print("❌ Coluna 'image_url' NÃO encontrada!")
                 print("⚠️  Execute a migration: scripts/migrations/001_add_image_url.sql")
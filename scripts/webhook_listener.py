@@ -11,163 +11,241 @@ Uso:
     5. Events: Just the push event
     
     No Orange Pi:
+    pip3 install aiohttp  # uma vez, no Python do host
     python3 scripts/webhook_listener.py
 """
 
 import os
 import hmac
 import hashlib
-import subprocess
+import asyncio
 import json
-from http.server import HTTPServer, BaseHTTPRequestHandler
+
+try:
+    from aiohttp import web
+except ImportError:
+    # Roda no Python do host (systemd), fora do container
+    print("❌ aiohttp não instalado no Python do host. Rode: pip3 install aiohttp")
+    raise SystemExit(1)
 
 # Configurações
 PORT = 9000
 WEBHOOK_SECRET = os.getenv('GITHUB_WEBHOOK_SECRET', 'seu_secret_aqui_mude_no_env')
+_SECRET_BYTES = WEBHOOK_SECRET.encode('utf-8')  # Chave do HMAC codificada uma única vez
 REPO_PATH = '/root/SteamBundleAPI'
 BRANCH = 'main'
+READ_CHUNK_SIZE = 64 * 1024  # Leitura do corpo em blocos de 64 KiB
+MAX_PAYLOAD = 25 * 1024 * 1024  # Limite de payload de webhook do GitHub (25 MiB)
+# Conexões keep-alive (HTTP/1.1) ficam abertas mais tempo que no proxy na frente
+# (cloudflared: 90s por padrão) - senão o listener fecha um socket que o proxy vai reutilizar
+KEEPALIVE_TIMEOUT = 120  # segundos
+DEPLOY_DEBOUNCE = 3  # segundos - pushes em rajada viram um único deploy
+
+# Deploy single-flight: no máximo uma task de deploy por vez (event loop único, sem threads)
+_deploy_pending = False
+_deploy_task = None
+
+
+def log(message):
+    """Log customizado"""
+    print(f"[WEBHOOK] {message}", flush=True)
+
+
+def verify_signature(signature, digest):
+    """
+    Verifica assinatura do GitHub para segurança
+    
+    Args:
+        signature: Header X-Hub-Signature-256
+        digest: HMAC-SHA256 do payload já calculado (bytes crus)
+    """
+    if not signature:
+        return False
+    
+    # Formato: "sha256=<64 hex>" - rejeita barato o que nem pode ser válido
+    algo, _, hexsig = signature.partition('=')
+    if algo != 'sha256' or len(hexsig) != 64:
+        return False
+    
+    try:
+        provided = bytes.fromhex(hexsig)
+    except ValueError:
+        return False
+    
+    # Comparação em tempo constante dos 32 bytes crus (sem hexdigest)
+    return hmac.compare_digest(digest, provided)
+
 
-class WebhookHandler(BaseHTTPRequestHandler):
+async def run_command(args, timeout):
+    """
+    Executa comando sem bloquear o event loop
     
-    def log_message(self, format, *args):
-        """Log customizado"""
-        print(f"[WEBHOOK] {format % args}")
+    Returns:
+        Tupla (returncode, stdout, stderr)
     
-    def verify_signature(self, payload):
-        """Verifica assinatura do GitHub para segurança"""
-        signature = self.headers.get('X-Hub-Signature-256')
-        if not signature:
+    Raises:
+        asyncio.TimeoutError: Comando excedeu o timeout (processo é morto)
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *args,
+        cwd=REPO_PATH,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise
+    
+    return proc.returncode, stdout.decode(errors='replace'), stderr.decode(errors='replace')
+
+
+async def deploy():
+    """Executa o deploy (git fetch + reset + restart container)"""
+    try:
+        # 1. Git fetch (só o último commit) + reset: sem merge, nunca trava em conflito
+        print("📥 Fazendo git fetch...")
+        returncode, stdout, stderr = await run_command(['git', 'fetch', '--depth=1', 'origin', BRANCH], timeout=30)
+        
+        if returncode != 0:
+            print(f"❌ Git fetch falhou: {stderr}")
             return False
         
-        expected_signature = 'sha256=' + hmac.new(
-            WEBHOOK_SECRET.encode(),
-            payload,
-            hashlib.sha256
-        ).hexdigest()
+        returncode, stdout, stderr = await run_command(['git', 'reset', '--hard', 'FETCH_HEAD'], timeout=10)
         
-        return hmac.compare_digest(signature, expected_signature)
-    
-    def do_POST(self):
-        """Processa POST do webhook GitHub"""
-        if self.path != '/webhook':
-            self.send_response(404)
-            self.end_headers()
-            return
+        if returncode != 0:
+            print(f"❌ Git reset falhou: {stderr}")
+            return False
         
-        # Lê payload
-        content_length = int(self.headers.get('Content-Length', 0))
-        payload = self.rfile.read(content_length)
+        print(f"✅ Git reset: {stdout.strip()}")
         
-        # Verifica assinatura (segurança)
-        if not self.verify_signature(payload):
-            print("❌ Assinatura inválida! Requisição rejeitada.")
-            self.send_response(401)
-            self.end_headers()
-            self.wfile.write(b'Invalid signature')
-            return
+        # 2. Restart container (SEM rebuild!)
+        print("🔄 Reiniciando container scraper...")
+        returncode, stdout, stderr = await run_command(['docker', 'compose', 'restart', 'scraper'], timeout=30)
         
-        # Parse JSON
-        try:
-            data = json.loads(payload)
-        except json.JSONDecodeError:
-            self.send_response(400)
-            self.end_headers()
-            return
+        if returncode != 0:
+            print(f"❌ Restart falhou: {stderr}")
+            return False
         
-        # Verifica se é push na branch correta
-        ref = data.get('ref', '')
-        if ref != f'refs/heads/{BRANCH}':
-            print(f"ℹ️  Push em branch '{ref}' ignorado (esperado: refs/heads/{BRANCH})")
-            self.send_response(200)
-            self.end_headers()
-            self.wfile.write(b'OK - wrong branch')
-            return
+        print("✅ Container reiniciado com sucesso!")
         
-        # Commit info
-        commits = data.get('commits', [])
-        if commits:
-            last_commit = commits[-1]
-            author = last_commit.get('author', {}).get('name', 'Unknown')
-            message = last_commit.get('message', 'No message')
-            print(f"\n🚀 Deploy iniciado!")
-            print(f"   Autor: {author}")
-            print(f"   Commit: {message}")
+        # 3. Verifica status
+        _, stdout, _ = await run_command(['docker', 'compose', 'ps', 'scraper'], timeout=10)
+        print(f"📊 Status:\n{stdout}")
         
-        # Executa deploy
-        success = self.deploy()
+        print("✅ Deploy concluído com sucesso!\n")
+        return True
         
-        if success:
-            self.send_response(200)
-            self.end_headers()
-            self.wfile.write(b'Deploy successful')
-        else:
-            self.send_response(500)
-            self.end_headers()
-            self.wfile.write(b'Deploy failed')
-    
-    def deploy(self):
-        """Executa o deploy (git pull + restart container)"""
-        try:
-            os.chdir(REPO_PATH)
-            
-            # 1. Git pull
-            print("📥 Fazendo git pull...")
-            result = subprocess.run(
-                ['git', 'pull', 'origin', BRANCH],
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
-            
-            if result.returncode != 0:
-                print(f"❌ Git pull falhou: {result.stderr}")
-                return False
-            
-            print(f"✅ Git pull: {result.stdout.strip()}")
-            
-            # 2. Restart container (SEM rebuild!)
-            print("🔄 Reiniciando container scraper...")
-            result = subprocess.run(
-                ['docker', 'compose', 'restart', 'scraper'],
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
-            
-            if result.returncode != 0:
-                print(f"❌ Restart falhou: {result.stderr}")
-                return False
-            
-            print("✅ Container reiniciado com sucesso!")
-            
-            # 3. Verifica status
-            result = subprocess.run(
-                ['docker', 'compose', 'ps', 'scraper'],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            print(f"📊 Status:\n{result.stdout}")
-            
-            print("✅ Deploy concluído com sucesso!\n")
-            return True
-            
-        except subprocess.TimeoutExpired:
-            print("❌ Timeout durante deploy")
-            return False
-        except Exception as e:
-            print(f"❌ Erro durante deploy: {e}")
-            return False
+    except asyncio.TimeoutError:
+        print("❌ Timeout durante deploy")
+        return False
+    except Exception as e:
+        print(f"❌ Erro durante deploy: {e}")
+        return False
+
+
+async def _deploy_worker():
+    """
+    Roda deploys enquanto houver push pendente
     
-    def do_GET(self):
-        """Health check"""
-        if self.path == '/health':
-            self.send_response(200)
-            self.end_headers()
-            self.wfile.write(b'OK')
-        else:
-            self.send_response(404)
-            self.end_headers()
+    Espera DEPLOY_DEBOUNCE antes de cada deploy para juntar pushes seguidos;
+    um push que chega durante o deploy agenda exatamente mais uma rodada.
+    """
+    global _deploy_pending, _deploy_task
+    try:
+        while _deploy_pending:
+            await asyncio.sleep(DEPLOY_DEBOUNCE)
+            _deploy_pending = False
+            await deploy()
+    finally:
+        _deploy_task = None
+
+
+def schedule_deploy():
+    """Marca deploy pendente e inicia o worker se nenhum estiver rodando"""
+    global _deploy_pending, _deploy_task
+    _deploy_pending = True
+    if _deploy_task is None:
+        _deploy_task = asyncio.create_task(_deploy_worker())
+        return True
+    return False
+
+
+async def handle_webhook(request):
+    """Processa POST do webhook GitHub"""
+    log(f"POST {request.path} de {request.remote}")
+    
+    # Valida o tamanho antes de ler qualquer byte do socket
+    content_length = request.content_length
+    if content_length is None:
+        return web.Response(status=411, text='Content-Length required')
+    if content_length > MAX_PAYLOAD:
+        return web.Response(status=413, text='Payload too large')
+    
+    # Lê payload em blocos num buffer pré-alocado, calculando o HMAC na mesma passada
+    mac = hmac.new(_SECRET_BYTES, None, hashlib.sha256)
+    payload = bytearray(content_length)
+    view = memoryview(payload)
+    received = 0
+    async for chunk in request.content.iter_chunked(READ_CHUNK_SIZE):
+        if received + len(chunk) > content_length:
+            return web.Response(status=400, text='Body larger than Content-Length')
+        mac.update(chunk)
+        view[received:received + len(chunk)] = chunk
+        received += len(chunk)
+    view.release()
+    
+    if received != content_length:
+        return web.Response(status=400, text='Incomplete body')
+    
+    # Verifica assinatura (segurança)
+    if not verify_signature(request.headers.get('X-Hub-Signature-256'), mac.digest()):
+        print("❌ Assinatura inválida! Requisição rejeitada.")
+        return web.Response(status=401, text='Invalid signature')
+    
+    # Parse JSON
+    try:
+        data = json.loads(payload)
+    except json.JSONDecodeError:
+        return web.Response(status=400)
+    
+    # Verifica se é push na branch correta
+    ref = data.get('ref', '')
+    if ref != f'refs/heads/{BRANCH}':
+        print(f"ℹ️  Push em branch '{ref}' ignorado (esperado: refs/heads/{BRANCH})")
+        return web.Response(text='OK - wrong branch')
+    
+    # Commit info
+    commits = data.get('commits', [])
+    if commits:
+        last_commit = commits[-1]
+        author = last_commit.get('author', {}).get('name', 'Unknown')
+        message = last_commit.get('message', 'No message')
+        print(f"\n🚀 Deploy iniciado!")
+        print(f"   Autor: {author}")
+        print(f"   Commit: {message}")
+    
+    # Deploy em background: responde 202 na hora para o GitHub não reenviar por timeout
+    if not schedule_deploy():
+        print("ℹ️  Deploy já em andamento - push agrupado na próxima rodada")
+    return web.Response(status=202, text='Deploy scheduled')
+
+
+async def handle_health(request):
+    """Health check"""
+    return web.Response(text='OK')
+
+
+def create_app():
+    """Cria aplicação aiohttp com as rotas do listener"""
+    app = web.Application(client_max_size=MAX_PAYLOAD)
+    app.router.add_post('/webhook', handle_webhook)
+    app.router.add_get('/health', handle_health)
+    return app
+
 
 def main():
     print("=" * 60)
@@ -180,13 +258,8 @@ def main():
     print("=" * 60)
     print("\n⏳ Aguardando webhooks do GitHub...\n")
     
-    server = HTTPServer(('0.0.0.0', PORT), WebhookHandler)
-    
-    try:
-        server.serve_forever()
-    except KeyboardInterrupt:
-        print("\n\n👋 Webhook listener encerrado")
-        server.shutdown()
+    web.run_app(create_app(), host='0.0.0.0', port=PORT, keepalive_timeout=KEEPALIVE_TIMEOUT, print=None)
+    print("\n\n👋 Webhook listener encerrado")
 
 if __name__ == '__main__':
     main()
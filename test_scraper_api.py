@@ -2,67 +2,103 @@
 import asyncio
 import aiohttp
 import json
+import orjson
 
-async def test():
-    bundle_id = 1000
-    url = 'https://api.steampowered.com/IStoreBrowseService/GetItems/v1/'
-    
-    ids_list = [{"bundleid": bundle_id}]
+from scraper.config import ScrapingConfig
+
+URL = 'https://api.steampowered.com/IStoreBrowseService/GetItems/v1/'
+API_KEY = '516C1E2D6FA9FECFB0DE14393F3FDCF0'
+BUNDLE_IDS = [1000]
+BATCH_SIZE = 50  # IDs por chamada ao GetItems
+
+# Conexões keep-alive: chamadas seguintes reaproveitam TCP/TLS e o DNS cacheado
+CONNECTOR_LIMIT = 32
+DNS_CACHE_TTL = 300
+KEEPALIVE_TIMEOUT = 60
+
+NSFW_IDS = ScrapingConfig.NSFW_DESCRIPTOR_IDS
+
+
+def show_bundle(bundle):
+    print('=' * 60)
+    print(f"BUNDLE {bundle.get('id')}")
+    print('=' * 60)
+    print('ASSETS (imagens):')
+    print('=' * 60)
+    print(json.dumps(bundle.get('assets', {}), indent=2))
+
+    print('\n' + '=' * 60)
+    print('IMAGE_URL extraído:')
+    print('=' * 60)
+    image_url = bundle.get('assets', {}).get('header', '')
+    print(f"'{image_url}'")
+    print(f"Vazio: {image_url == ''}")
+
+    print('\n' + '=' * 60)
+    print('CONTENT DESCRIPTORS (NSFW):')
+    print('=' * 60)
+    descriptors = bundle.get('content_descriptorids') or []
+    print(f"IDs: {descriptors}")
+    print(f"Is NSFW ({sorted(NSFW_IDS)}): {not NSFW_IDS.isdisjoint(descriptors)}")
+
+    print('\n' + '=' * 60)
+    print('INCLUDED_ITEMS (games):')
+    print('=' * 60)
+    items = bundle.get('included_items', [])
+    print(f"Total: {len(items)}")
+    if items:
+        print('\nPrimeiro item:')
+        print(json.dumps(items[0], indent=2))
+
+        game_ids = [item['id'] for item in items if item.get('item_type') == 0]
+        print(f'\nGames filtrados (item_type==0): {len(game_ids)}')
+
+
+async def fetch(session, bundle_ids_chunk):
+    # Um único input_json com todos os IDs do lote: 1 round-trip por lote
+    ids_list = [{"bundleid": bid} for bid in bundle_ids_chunk]
     context = {"language": "brazilian", "country_code": "BR"}
     input_json = json.dumps({"ids": ids_list, "context": context})
-    
+
     params = {
-        'key': '516C1E2D6FA9FECFB0DE14393F3FDCF0',
+        'key': API_KEY,
         'input_json': input_json
     }
-    
-    print(f'🔍 Testando Bundle {bundle_id}...\n')
-    
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, params=params) as resp:
-            print(f'Status: {resp.status}')
-            data = await resp.json()
-            
-            print('\n' + '=' * 60)
-            print('RESPOSTA COMPLETA DA API:')
-            print('=' * 60)
-            print(json.dumps(data, indent=2))
-            
-            if 'response' not in data or 'store_items' not in data['response']:
-                print('\n❌ Resposta não tem store_items!')
-                return
-                
-            bundle = data['response']['store_items'][0]
-            
-            print('=' * 60)
-            print('ASSETS (imagens):')
-            print('=' * 60)
-            print(json.dumps(bundle.get('assets', {}), indent=2))
-            
-            print('\n' + '=' * 60)
-            print('IMAGE_URL extraído:')
-            print('=' * 60)
-            image_url = bundle.get('assets', {}).get('header', '')
-            print(f"'{image_url}'")
-            print(f"Vazio: {image_url == ''}")
-            
-            print('\n' + '=' * 60)
-            print('CONTENT DESCRIPTORS (NSFW):')
-            print('=' * 60)
-            descriptors = bundle.get('content_descriptorids', [])
-            print(f"IDs: {descriptors}")
-            print(f"Is NSFW (3 in list): {3 in descriptors}")
-            
-            print('\n' + '=' * 60)
-            print('INCLUDED_ITEMS (games):')
-            print('=' * 60)
-            items = bundle.get('included_items', [])
-            print(f"Total: {len(items)}")
-            if items:
-                print('\nPrimeiro item:')
-                print(json.dumps(items[0], indent=2))
-                
-                games = [{'app_id': item['id']} for item in items if item.get('item_type') == 0]
-                print(f'\nGames filtrados (item_type==0): {len(games)}')
+
+    print(f'🔍 Testando Bundles {bundle_ids_chunk}...\n')
+
+    async with session.get(URL, params=params) as resp:
+        print(f'Status: {resp.status}')
+        # Lê os bytes uma vez: imprime o corpo cru e faz um único parse
+        raw = await resp.read()
+
+        print('\n' + '=' * 60)
+        print('RESPOSTA COMPLETA DA API:')
+        print('=' * 60)
+        print(raw.decode())
+
+        data = orjson.loads(raw)
+
+        if 'response' not in data or 'store_items' not in data['response']:
+            print('\n❌ Resposta não tem store_items!')
+            return
+
+        for bundle in data['response']['store_items']:
+            show_bundle(bundle)
+
+
+async def test(bundle_ids=BUNDLE_IDS):
+    # Uma única sessão para todos os bundles (criada dentro do event loop)
+    connector = aiohttp.TCPConnector(
+        limit=CONNECTOR_LIMIT,
+        ttl_dns_cache=DNS_CACHE_TTL,
+        keepalive_timeout=KEEPALIVE_TIMEOUT
+    )
+    session = aiohttp.ClientSession(connector=connector)
+    try:
+        chunks = [bundle_ids[i:i + BATCH_SIZE] for i in range(0, len(bundle_ids), BATCH_SIZE)]
+        await asyncio.gather(*[fetch(session, chunk) for chunk in chunks])
+    finally:
+        await session.close()
 
 asyncio.run(test())